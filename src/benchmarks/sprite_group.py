@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+'''
+Compares updating and drawing a list of sprites with a SpriteGroup.
+
+Run from the src directory: python -m benchmarks.sprite_group [count]
+
+Created on Oct 18, 2026
+
+@author: Robb
+'''
+
+import random
+import sys
+import time
+
+from game_tools import simplegui
+from game_tools import sprite
+
+SPRITE_COUNT = 10000
+FRAMES = 60
+WORLD_SIZE = (600, 400)
+
+def random_sprite(sprite_class):
+    '''A small bouncing sprite somewhere in the world'''
+    return sprite_class(pos=(random.uniform(0, WORLD_SIZE[0]), random.uniform(0, WORLD_SIZE[1])),
+                        vel=(random.uniform(-5, 5), random.uniform(-5, 5)),
+                        size=(4, 4),
+                        update_method=sprite.update_bounce)
+
+def time_frames(update, draw, canvas):
+    '''Milliseconds per frame of updating and drawing'''
+    start = time.time()
+    for _ in range(FRAMES):
+        canvas.draw_background()
+        update()
+        draw(canvas)
+    return 1000*(time.time() - start)/FRAMES
+
+def run(count=SPRITE_COUNT):
+    '''Prints the benchmark results'''
+    canvas = simplegui.Canvas(WORLD_SIZE)
+
+    sprites = [random_sprite(sprite.CompactSprite) for _ in range(count)]
+    def update_list():
+        for the_sprite in sprites:
+            the_sprite.update(WORLD_SIZE)
+    def draw_list(canvas):
+        for the_sprite in sprites:
+            the_sprite.draw(canvas)
+
+    group = sprite.SpriteGroup(count, update_method=sprite.update_bounce)
+    for the_sprite in sprites:
+        group.add_sprite(the_sprite)
+
+    print('{0} sprites, {1} frames'.format(count, FRAMES))
+    print('{0:>14}: {1:7.2f} ms per frame'.format('sprite list', time_frames(update_list, draw_list, canvas)))
+    print('{0:>14}: {1:7.2f} ms per frame'.format('SpriteGroup', time_frames(lambda: group.update(WORLD_SIZE), group.draw, canvas)))
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else SPRITE_COUNT)
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+'''
+Compares the memory and attribute access cost of Sprite and CompactSprite.
+
+Run from the src directory: python -m benchmarks.sprite_memory [count]
+
+Created on Oct 18, 2026
+
+@author: Robb
+'''
+
+import sys
+import timeit
+
+from game_tools import sprite
+
+SPRITE_COUNT = 100000
+ACCESS_LOOPS = 1000000
+
+def make_sprites(sprite_class, count):
+    '''Makes count sprites laid out like world blocks'''
+    return [sprite_class('block', (i % 1000, i // 1000), size=(30,30), color='Red') for i in range(count)]
+
+def sprite_bytes(the_sprite):
+    '''Bytes used by the sprite object and its instance dictionary, if it has one'''
+    size = sys.getsizeof(the_sprite)
+    if hasattr(the_sprite, '__dict__'):
+        size += sys.getsizeof(the_sprite.__dict__)
+    return size
+
+def access_time(sprite_class, statement):
+    '''Seconds per million runs of the statement on a sprite of the class'''
+    setup = 'from game_tools import sprite; s = sprite.{0}("block", (1,2), size=(30,30))'.format(sprite_class.__name__)
+    return timeit.timeit(statement, setup, number=ACCESS_LOOPS)
+
+def run(count=SPRITE_COUNT):
+    '''Prints the benchmark results'''
+    print('{0} sprites'.format(count))
+    for sprite_class in (sprite.Sprite, sprite.CompactSprite):
+        sprites = make_sprites(sprite_class, count)
+        total = sum(sprite_bytes(s) for s in sprites)
+        print('{0:>14}: {1:8.1f} MB, {2:4d} bytes per sprite'.format(sprite_class.__name__, total/1e6, total//count))
+        for statement in ('s.color', 's.pos', 's.pos = (3, 4)', 's.move((1, 1))'):
+            print('{0:>14}  {1:<16} {2:.3f} s per million'.format('', statement, access_time(sprite_class, statement)))
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else SPRITE_COUNT)
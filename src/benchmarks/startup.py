@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+'''
+Times a cold start of the menu, from a new interpreter to the first menu frame.
+
+Run from the src directory: python -m benchmarks.startup [runs] [backend]
+
+Created on Oct 18, 2026
+
+@author: Robb
+'''
+
+import subprocess
+import sys
+import time
+
+RUNS = 5
+BACKEND = 'window'
+
+# runs in a new interpreter, printing the seconds taken by each startup step
+CHILD = '''
+import time
+start = time.time()
+import menu
+imported = time.time()
+frame = menu.setup({0!r})
+setup = time.time()
+frame.step()
+drawn = time.time()
+print('{{0}} {{1}} {{2}}'.format(imported - start, setup - imported, drawn - setup))
+'''
+
+def start_menu(backend=BACKEND):
+    '''Starts the menu in a new interpreter, returns the seconds for (interpreter, import, setup, first frame)'''
+    start = time.time()
+    output = subprocess.check_output([sys.executable, '-c', CHILD.format(backend)])
+    total = time.time() - start
+    steps = [float(t) for t in output.split()[-3:]]
+    return [total - sum(steps)] + steps
+
+def run(runs=RUNS, backend=BACKEND):
+    '''Prints the benchmark results'''
+    times = [start_menu(backend) for _ in range(runs)]
+    print('{0} cold starts of the menu, {1} backend'.format(runs, backend))
+    for i, step in enumerate(('interpreter', 'import', 'setup', 'first frame')):
+        step_times = [t[i] for t in times]
+        print('{0:>14}: {1:7.1f} ms best, {2:7.1f} ms mean'.format(step, 1000*min(step_times), 1000*sum(step_times)/runs))
+    totals = [sum(t) for t in times]
+    print('{0:>14}: {1:7.1f} ms best, {2:7.1f} ms mean'.format('total', 1000*min(totals), 1000*sum(totals)/runs))
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else RUNS, sys.argv[2] if len(sys.argv) > 2 else BACKEND)
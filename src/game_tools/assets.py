@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+'''
+Process wide image assets, so each image file is read and decoded once no
+matter how many games use it
+
+Created on Oct 18, 2026
+
+@author: Robb
+'''
+
+import os
+import threading
+
+import pygame
+
+from game_tools import simplegui
+
+class AssetManager(object):
+    '''
+    Shares images between games. Each file is decoded once and each
+    (file, size) gets one simplegui.Image, loaded when it is first drawn.
+    Files can be decoded ahead of time on a background thread, the images
+    are still converted for the display on the main thread.
+    Images packed in the atlas built by tools.build_atlas are served from it
+    instead of their own files.
+    '''
+
+    def __init__(self, atlas_file=simplegui.ATLAS_FILE, atlas_index_file=simplegui.ATLAS_INDEX_FILE):
+        '''Creates an empty manager, using the atlas if its files exist'''
+        self.images = {}
+        self.surfaces = {}
+        self.lock = threading.Lock()
+        self.preload_thread = None
+        self.atlas_file = atlas_file
+        self.atlas_index_file = atlas_index_file
+        self.atlas = None
+
+    def get_image(self, img_info, lazy=True):
+        '''Gets the shared image for the image info, waiting to load it until it is drawn if lazy'''
+        key = (img_info.img_file, tuple(img_info.size))
+        image = self.images.get(key)
+        if image is None:
+            image = simplegui.Image(simplegui.Image_Info(img_info.img_file, tuple(img_info.size)), loader=self.load_surface, lazy=lazy)
+            self.images[key] = image
+        elif not lazy:
+            image.load()
+        return image
+
+    def get_images(self, image_infos, lazy=True):
+        '''Gets a dictionary of shared images for a dictionary of image infos'''
+        return dict([(key, self.get_image(image_info, lazy)) for key, image_info in image_infos.iteritems()])
+
+    def load_atlas(self):
+        '''Gets the atlas, reading it the first time, or None if it has not been built'''
+        with self.lock:
+            if self.atlas is None and os.path.exists(self.atlas_index_file) and os.path.exists(self.atlas_file):
+                self.atlas = simplegui.Atlas(self.atlas_file, self.atlas_index_file)
+        return self.atlas
+
+    def in_atlas(self, img_file):
+        '''Checks if the image file is served from the atlas'''
+        atlas = self.load_atlas()
+        return atlas is not None and atlas.has_image(img_file)
+
+    def load_surface(self, img_file):
+        '''Gets the decoded surface for the file, from the atlas or reading it unless it was already read'''
+        if self.in_atlas(img_file):
+            return self.atlas.load(img_file)
+        with self.lock:
+            surface = self.surfaces.get(img_file)
+        if surface is None:
+            surface = pygame.image.load(img_file)
+            with self.lock:
+                surface = self.surfaces.setdefault(img_file, surface)
+        return surface
+
+    def preload(self, img_files, background=True):
+        '''Decodes the image files, on a background thread unless background is False'''
+        img_files = [img_file for img_file in img_files if img_file not in self.surfaces]
+        if not background:
+            # atlas images are converted when first loaded, on the main thread
+            for img_file in img_files:
+                if not self.in_atlas(img_file):
+                    self.load_surface(img_file)
+            return
+        self.wait()
+        self.preload_thread = threading.Thread(target=self.preload, args=(img_files, False), name='preload images')
+        self.preload_thread.daemon = True
+        self.preload_thread.start()
+
+    def preload_atlas(self, background=True):
+        '''Reads the atlas, on a background thread unless background is False'''
+        if not background:
+            self.load_atlas()
+            return
+        self.wait()
+        self.preload_thread = threading.Thread(target=self.load_atlas, name='preload atlas')
+        self.preload_thread.daemon = True
+        self.preload_thread.start()
+
+    def wait(self):
+        '''Waits for a background preload to finish'''
+        if self.preload_thread:
+            self.preload_thread.join()
+            self.preload_thread = None
+
+    def clear(self):
+        '''Forgets all the images and decoded files'''
+        self.wait()
+        self.images.clear()
+        with self.lock:
+            self.surfaces.clear()
+            self.atlas = None
+
+    def __repr__(self):
+        '''Returns the number of images and decoded files'''
+        return 'AssetManager(images={0!r}, surfaces={1!r}, atlas={2!r})'.format(len(self.images), len(self.surfaces), self.atlas)
+
+ASSETS = AssetManager()
+
+def get_image(img_info, lazy=True):
+    '''Gets the shared image for the image info'''
+    return ASSETS.get_image(img_info, lazy)
+
+def get_images(image_infos, lazy=True):
+    '''Gets a dictionary of shared images for a dictionary of image infos'''
+    return ASSETS.get_images(image_infos, lazy)
+
+def preload(image_infos, background=True):
+    '''Decodes the files of the image infos, on a background thread by default'''
+    ASSETS.preload([image_info.img_file for image_info in image_infos if image_info], background)
+
+def preload_atlas(background=True):
+    '''Reads the image atlas, on a background thread by default'''
+    ASSETS.preload_atlas(background)
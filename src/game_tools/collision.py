@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+'''
+Swept collision detection, so fast objects hit things between ticks instead
+of tunneling through them
+
+Rectangles are given by their center position and size, velocities are the
+distance moved in one tick and times are fractions of the tick.
+
+Created on Oct 18, 2026
+
+@author: Robb
+'''
+
+import math
+
+MAX_HITS = 4
+# hits this soon after hitting the same target are it being hit again where the path left it
+REHIT_TIME = 1e-9
+
+class Box(object):
+    '''
+    A rectangle to collide with, like a wall, with a center position, size and velocity
+    '''
+    __slots__ = ('pos', 'size', 'vel')
+
+    def __init__(self, pos, size, vel=(0,0)):
+        '''Creates the box'''
+        self.pos = pos
+        self.size = size
+        self.vel = vel
+
+    def __repr__(self):
+        '''Returns the position, size and velocity'''
+        return 'Box(pos={0!r}, size={1!r}, vel={2!r})'.format(self.pos, self.size, self.vel)
+
+def world_walls(world_size, sides='ltrb'):
+    '''Boxes just outside the world on the left, top, right and bottom sides, as thick as the world'''
+    w, h = world_size
+    walls = {'l': Box((-0.5*w, 0.5*h), (w, 3*h)),
+             't': Box((0.5*w, -0.5*h), (3*w, h)),
+             'r': Box((1.5*w, 0.5*h), (w, 3*h)),
+             'b': Box((0.5*w, 1.5*h), (3*w, h))}
+    return [walls[side] for side in sides]
+
+def sprite_rect(target):
+    '''The center position, size and velocity of a sprite or box'''
+    return target.pos, target.size, target.vel
+
+def sweep_rect(pos, size, vel, other_pos, other_size, other_vel=(0,0), max_time=1.0):
+    '''
+    Time of impact of a moving rectangle with another rectangle within
+    max_time, returned as (time, normal) or None if they do not hit.
+    The normal points from the other rectangle back toward the moving one.
+    Rectangles that already overlap hit at time 0, pushing out the shortest
+    way, but only if they are moving further into each other.
+    '''
+    entry = -float('inf')
+    exit = float('inf')
+    entry_axis = None
+    rel_vel = [v1 - v2 for v1, v2 in zip(vel, other_vel)]
+    for axis in (0, 1):
+        dist = other_pos[axis] - pos[axis]
+        reach = 0.5*(size[axis] + other_size[axis])
+        if rel_vel[axis] == 0:
+            if abs(dist) >= reach:
+                return None
+            continue
+        times = sorted(((dist - reach)/rel_vel[axis], (dist + reach)/rel_vel[axis]))
+        if times[0] > entry:
+            entry = times[0]
+            entry_axis = axis
+        exit = min(exit, times[1])
+
+    if entry_axis is None or entry >= exit or exit <= 0 or entry > max_time:
+        return None
+    if entry >= 0:
+        normal = [0, 0]
+        normal[entry_axis] = -1 if rel_vel[entry_axis] > 0 else 1
+        return entry, tuple(normal)
+
+    # already overlapping
+    gaps = [abs(p2 - p1) - 0.5*(s1 + s2) for p1, s1, p2, s2 in zip(pos, size, other_pos, other_size)]
+    axis = 0 if gaps[0] > gaps[1] else 1
+    normal = [0, 0]
+    normal[axis] = -1 if other_pos[axis] > pos[axis] else 1
+    if rel_vel[axis]*normal[axis] < 0:
+        return 0., tuple(normal)
+    return None
+
+def sweep_circle(center, radius, vel, rect_pos, rect_size, rect_vel=(0,0), max_time=1.0):
+    '''
+    Time of impact of a moving circle with a rectangle within max_time,
+    returned as (time, normal) or None, like sweep_rect. The corners of the
+    rectangle are rounded by the radius, so glancing hits bounce off at an angle.
+    '''
+    hit = sweep_rect(center, (2*radius, 2*radius), vel, rect_pos, rect_size, rect_vel, max_time)
+    if hit is None:
+        return None
+
+    time = hit[0]
+    rel_vel = [v1 - v2 for v1, v2 in zip(vel, rect_vel)]
+    hit_pos = [c + time*v - p for c, v, p in zip(center, rel_vel, rect_pos)]
+    if abs(hit_pos[0]) <= 0.5*rect_size[0] or abs(hit_pos[1]) <= 0.5*rect_size[1]:
+        # hit a side
+        return hit
+
+    # hit near a corner, so check against the circle around the corner
+    corner = [p + math.copysign(0.5*s, h) for p, s, h in zip(rect_pos, rect_size, hit_pos)]
+    offset = [c - k for c, k in zip(center, corner)]
+    a = rel_vel[0]**2 + rel_vel[1]**2
+    b = 2*(offset[0]*rel_vel[0] + offset[1]*rel_vel[1])
+    c = offset[0]**2 + offset[1]**2 - radius**2
+    if c < 0:
+        # already overlapping the corner
+        length = math.sqrt(offset[0]**2 + offset[1]**2)
+        if length == 0 or b >= 0:
+            return None
+        return 0., (offset[0]/length, offset[1]/length)
+    disc = b*b - 4*a*c
+    if a == 0 or disc < 0:
+        return None
+    time = (-b - math.sqrt(disc))/(2*a)
+    if time < 0 or time > max_time:
+        return None
+    return time, tuple((o + time*v)/radius for o, v in zip(offset, rel_vel))
+
+def reflect(vel, normal):
+    '''Reflects the velocity off a surface with the normal, if moving into it'''
+    dot = vel[0]*normal[0] + vel[1]*normal[1]
+    if dot >= 0:
+        return tuple(vel)
+    return tuple(v - 2*dot*n for v, n in zip(vel, normal))
+
+def sweep_path(pos, vel, targets, sweep, rect_of=sprite_rect, bounce=None, max_hits=MAX_HITS):
+    '''
+    Moves a position through one tick of its velocity, stopping at each of
+    the targets it hits in the order they are hit.
+
+    sweep(pos, vel, target_pos, target_size, target_vel, max_time) finds a
+    hit, like sweep_rect or sweep_circle with the moving shape's size bound.
+    rect_of(target) gives the target's center position, size and velocity.
+    bounce(target, pos, vel, normal) gives the velocity after a hit and
+    defaults to reflect. A target isn't hit again right where it was just
+    hit, but can be hit again after the path hits something else. A path
+    that runs out of hits, like a ball squeezed between a paddle and a wall,
+    stops at its last hit for the rest of the tick.
+
+    Returns the end position, the end velocity and the hits as
+    (time, normal, target) tuples.
+    '''
+    targets = list(targets)
+    elapsed = 0.
+    hits = []
+    last_target = None
+    while targets and len(hits) < max_hits:
+        first = None
+        for target in targets:
+            target_pos, target_size, target_vel = rect_of(target)
+            target_pos = [p + elapsed*v for p, v in zip(target_pos, target_vel)]
+            hit = sweep(pos, vel, target_pos, target_size, target_vel, 1.0 - elapsed)
+            if hit and target is last_target and hit[0] <= REHIT_TIME:
+                continue
+            if hit and (first is None or hit[0] < first[0]):
+                first = (hit[0], hit[1], target)
+        if first is None:
+            break
+        time, normal, target = first
+        pos = tuple(p + time*v for p, v in zip(pos, vel))
+        elapsed += time
+        vel = bounce(target, pos, vel, normal) if bounce else reflect(vel, normal)
+        last_target = target
+        hits.append((elapsed, normal, target))
+    if len(hits) < max_hits:
+        pos = tuple(p + (1.0 - elapsed)*v for p, v in zip(pos, vel))
+    return pos, tuple(vel), hits
+
+def sweep_sprite(the_sprite, targets, bounce=None, max_hits=MAX_HITS):
+    '''
+    Moves a sprite through one tick of its velocity, bouncing off the targets
+    it hits on the way. Returns the hits as (time, normal, target) tuples.
+    '''
+    size = the_sprite.size
+    def sweep(pos, vel, target_pos, target_size, target_vel, max_time):
+        return sweep_rect(pos, size, vel, target_pos, target_size, target_vel, max_time)
+    the_sprite.pos, the_sprite.vel, hits = sweep_path(the_sprite.pos, the_sprite.vel, targets, sweep, bounce=bounce, max_hits=max_hits)
+    return hits
+
+def swept_bounds(pos, size, vel):
+    '''The center and size of a box covering everywhere a rectangle can reach in one tick, even after bounces'''
+    return pos, tuple(s + 2*abs(v) for s, v in zip(size, vel))
@@ -9,19 +9,35 @@ Created on Jun 7, 2014
 '''
 
 import pygame
+import collections
+import json
+import os
+import sys
+import tempfile
 
 if not pygame.font: print('Warning, fonts disabled')
 if not pygame.mixer: print('Warning, sound disabled')
  
-# initializations
-pygame.init()
+# the display is only initialized by frames that open a window, fonts by the first text drawn
 
 ALIGNMENTS = (('left','center','right'),('top','middle','bottom'))
 
-FONT_FACE_DICT = {'serif':pygame.font.match_font('timesnewroman'),
-                  'sans-serif':pygame.font.match_font('arial')}
+# window: draws to a display window and reads pygame's events
+# offscreen: draws to a surface in memory and reads posted events
+# none: skips drawing and reads posted events
+BACKENDS = ('window','offscreen','none')
+
+# fonts for each face, matched to font files the first time the face is used
+# since matching scans the system's fonts
+FONT_NAMES = {'serif':'timesnewroman',
+              'sans-serif':'arial'}
+FONT_FACE_DICT = {}
 FONT_DICT = {}
 
+# matched font files are kept between runs, since matching can take hundreds of milliseconds
+FONT_CACHE_FILE = os.path.join(os.path.expanduser('~'), '.cache', 'python_games', 'fonts.json')
+font_file_cache = None
+
 COLOR_PALETTE = dict([('Black','Black'),
                       ('White','Ivory'),
                       ('Gray','Gray'),
@@ -35,23 +51,188 @@ COLOR_PALETTE = dict([('Black','Black'),
 
 BACKGROUND_COLORS = COLOR_PALETTE.keys()
 
+# above this many dirty regions a single bounding rectangle is cheaper to update
+MAX_DIRTY_RECTS = 64
+
+# most fixed timestep updates run per frame before the simulation gives up catching up
+MAX_UPDATES_PER_FRAME = 5
+
+# memory budget for the rendered text surfaces kept by draw_text
+TEXT_CACHE_BYTES = 4*1024*1024
+
+# default memory budget for the rotated and scaled surfaces kept by each image
+IMAGE_CACHE_BYTES = 1024*1024
+
+# the images packed into one file by tools.build_atlas
+ATLAS_FILE = '../lib/images/atlas.png'
+ATLAS_INDEX_FILE = '../lib/images/atlas.txt'
+
+def font_environment():
+    '''Describes what matching fonts depends on, so cached font files are only used where they were matched'''
+    return '|'.join([sys.platform, pygame.version.ver] +
+                    [os.environ.get(name, '') for name in ('FONTCONFIG_FILE', 'FONTCONFIG_PATH', 'XDG_DATA_DIRS')])
+
+def read_font_cache(cache_file=FONT_CACHE_FILE):
+    '''Reads all the cached font files, by environment and then font name'''
+    try:
+        with open(cache_file) as f:
+            cache = json.load(f)
+        return cache if type(cache) == dict else {}
+    except (IOError, ValueError):
+        return {}
+
+def write_font_cache(font_files, cache_file=FONT_CACHE_FILE):
+    '''Saves the font files matched in this environment, ignoring failures since the cache only saves time'''
+    cache = read_font_cache(cache_file)
+    cache[font_environment()] = font_files
+    temp_file = None
+    try:
+        if not os.path.isdir(os.path.dirname(cache_file)):
+            os.makedirs(os.path.dirname(cache_file))
+        # each process writes its own temporary file, so runs at the same time can't mix their writes
+        handle, temp_file = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(cache_file))
+        with os.fdopen(handle, 'w') as f:
+            json.dump(cache, f, indent=1, sort_keys=True)
+        if os.path.exists(cache_file):
+            os.remove(cache_file)
+        os.rename(temp_file, cache_file)
+    except (IOError, OSError):
+        if temp_file and os.path.exists(temp_file):
+            os.remove(temp_file)
+
+def match_font_file(font_name):
+    '''
+    Gets the file of a font by name from the cache or by matching it.
+    Returns None for pygame's default font when there is no match.
+    '''
+    global font_file_cache
+    if font_file_cache is None:
+        font_file_cache = read_font_cache().get(font_environment(), {})
+    
+    font_file = font_file_cache.get(font_name)
+    if font_file is None or (font_file and not os.path.exists(font_file)):
+        # an empty file name records that nothing matched
+        font_file = pygame.font.match_font(font_name) or ''
+        font_file_cache[font_name] = font_file
+        write_font_cache(font_file_cache)
+    if type(font_file) == unicode:
+        font_file = font_file.encode(sys.getfilesystemencoding() or 'utf-8')
+    return font_file or None
+
+def get_font_file(font_face):
+    '''Gets the font file for a font face, matching it the first time'''
+    if not FONT_NAMES.has_key(font_face):
+        raise ValueError('Not a valid font face: '+font_face+'\nShould be in: ' + str(FONT_NAMES.keys()))
+    if not FONT_FACE_DICT.has_key(font_face):
+        FONT_FACE_DICT[font_face] = match_font_file(FONT_NAMES[font_face])
+    return FONT_FACE_DICT[font_face]
+
 def get_font(font_face, font_size):
     '''Gets a font object'''
-    if not FONT_FACE_DICT.has_key(font_face):
-        raise('Not a valid font face: '+font_face+'\nShould be in: ' + FONT_FACE_DICT.keys())
     if not FONT_DICT.has_key((font_face,font_size)):
-        FONT_DICT[(font_face,font_size)] = pygame.font.Font(FONT_FACE_DICT[font_face], font_size)
+        if not pygame.font.get_init():
+            pygame.font.init()
+        FONT_DICT[(font_face,font_size)] = pygame.font.Font(get_font_file(font_face), font_size)
     return FONT_DICT[(font_face,font_size)]
+
+def prewarm_fonts(font_sizes, font_face='sans-serif'):
+    '''Loads the fonts for the sizes ahead of time, so the first frame does not wait on them'''
+    for font_size in font_sizes:
+        get_font(font_face, int(font_size))
+
+def key_name(event):
+    '''Gets the name of the key for a key event, posted events carry the name'''
+    if hasattr(event, 'key_name'):
+        return event.key_name
+    return pygame.key.name(event.key)
+
+def surface_bytes(surface):
+    '''Approximate memory used by a surface's pixels'''
+    return surface.get_pitch()*surface.get_height()
+
+class SurfaceCache(object):
+    '''
+    Least recently used cache of surfaces with a bounded memory budget
+    '''
+    
+    def __init__(self, max_bytes):
+        '''Creates an empty cache holding at most max_bytes of pixels'''
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._surfaces = {}
+        self._tick = 0
+        
+    def get(self, key):
+        '''Gets the surface for key, or None if it is not cached'''
+        entry = self._surfaces.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._tick += 1
+        entry[1] = self._tick
+        return entry[0]
+    
+    def put(self, key, surface):
+        '''Caches the surface, evicting the least recently used ones over budget'''
+        if key in self._surfaces:
+            self.used_bytes -= surface_bytes(self._surfaces.pop(key)[0])
+        
+        size = surface_bytes(surface)
+        if size <= self.max_bytes:
+            self._tick += 1
+            self._surfaces[key] = [surface, self._tick]
+            self.used_bytes += size
+            if self.used_bytes > self.max_bytes:
+                self.evict(self.max_bytes*3/4)
+        return surface
+    
+    def evict(self, target_bytes):
+        '''Drops the least recently used surfaces until at most target_bytes are used'''
+        for key, entry in sorted(self._surfaces.items(), key=lambda item: item[1][1]):
+            if self.used_bytes <= target_bytes:
+                break
+            del self._surfaces[key]
+            self.used_bytes -= surface_bytes(entry[0])
+    
+    def clear(self):
+        '''Empties the cache and resets the counters'''
+        self._surfaces.clear()
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        
+    def __len__(self):
+        '''Number of cached surfaces'''
+        return len(self._surfaces)
+    
+    def __repr__(self):
+        '''Returns the cache budget, usage and counters'''
+        return 'SurfaceCache(max_bytes={0!r}, used_bytes={1!r}, surfaces={2!r}, hits={3!r}, misses={4!r})'.format(self.max_bytes, self.used_bytes, len(self), self.hits, self.misses)
+
+TEXT_CACHE = SurfaceCache(TEXT_CACHE_BYTES)
     
 class Frame(object):
     '''
     Creates a window for drawing and event handling.
     '''
 
-    def __init__(self, title, size = (640, 480), control_panel_width = 0, fps = 60, canvas_color='Black', control_panel_color='Gray'):
+    def __init__(self, title, size = (640, 480), control_panel_width = 0, fps = 60, canvas_color='Black', control_panel_color='Gray', dirty_rects=False, backend='window'):
         '''
         Creates the frame
+        
+        With dirty_rects on only the regions drawn this frame and last frame
+        are cleared, copied to the screen and updated on the display.
+        
+        The backend is one of BACKENDS, the headless ones ('offscreen' and
+        'none') never touch the display and take events from post_event.
         '''
+        if backend not in BACKENDS:
+            raise ValueError('Not a valid backend: '+str(backend)+'\nShould be in: '+str(BACKENDS))
+        self.backend = backend
+        self.events = collections.deque()
         self.running = False
         self.title = title
         #self.screen = pygame.display.set_mode((size[0]+control_panel_width,size[1]))
@@ -73,20 +254,39 @@ class Frame(object):
         self.FPS = fps
         
         self.draw_handler = None
+        self.update_handler = None
+        self.update_rate = fps
+        self.max_updates = MAX_UPDATES_PER_FRAME
+        self.update_accumulator = 0.
+        self.interpolation = 0.
+        self.turbo = False
+        self.render_every = 1
+        self.tick_count = 0
         self.mouse_left_click_handler = None
         self.mouse_right_click_handler = None
         self.mouse_move_handler = None
         self.key_down_handler = None
         self.key_up_handler = None
         
-        self.surface_count = 0
+        self.dirty_rects = dirty_rects
         
         self.setup_screen()
         
     def setup_screen(self):
         '''Sets up the screen'''
-        self.screen = pygame.display.set_mode((self.canvas_size[0]+self.control_panel_size[0],self.canvas_size[1]))
-        pygame.display.set_caption(self.title)
+        screen_size = (self.canvas_size[0]+self.control_panel_size[0],self.canvas_size[1])
+        if self.backend == 'window':
+            pygame.init()
+            self.screen = pygame.display.set_mode(screen_size)
+            pygame.display.set_caption(self.title)
+        elif self.backend == 'offscreen':
+            self.screen = pygame.Surface(screen_size)
+        else:
+            self.screen = None
+        # without a screen the dirty regions are never erased
+        self.canvas.set_dirty_tracking(self.dirty_rects and self.backend != 'none')
+        if self.control_panel:
+            self.control_panel.invalidate()
         
     def start(self):
         '''Starts the frame'''
@@ -106,6 +306,39 @@ class Frame(object):
         '''Sets the draw handler for the frame'''
         self.draw_handler = draw_handler
         
+    def set_static_layer(self, draw_handler):
+        '''
+        Draws the rarely changing part of the game into a layer under the
+        canvas with draw_handler. Returns the layer, which has to be
+        invalidated where the drawing changes.
+        '''
+        layer = StaticLayer(self.canvas_size, draw_handler)
+        self.canvas.set_background_layer(layer)
+        return layer
+        
+    def set_update_handler(self, update_handler, update_rate=60, max_updates=MAX_UPDATES_PER_FRAME):
+        '''
+        Sets the update handler, called update_rate times a simulated second
+        independent of the frame rate.
+        
+        At most max_updates are run per frame to catch up after a slow frame,
+        the remaining time is dropped and the simulation slows down instead.
+        '''
+        self.update_handler = update_handler
+        self.update_rate = update_rate
+        self.max_updates = max_updates
+        self.update_accumulator = 0.
+        self.interpolation = 0.
+        
+    def set_turbo(self, turbo, render_every=1):
+        '''
+        Turns turbo mode on or off. In turbo mode the frame runs one update
+        per loop as fast as the CPU allows and only draws every render_every
+        ticks (never when 0).
+        '''
+        self.turbo = turbo
+        self.render_every = render_every
+        
     def set_background_color(self, color):
         '''Sets the frames background color'''
         self.canvas.set_background_color(color)
@@ -144,7 +377,7 @@ class Frame(object):
         return self.control_panel.add_label(text, width, font_height)
     
     def screen_shot(self):
-        if self.screen_shot_file and self.screen_shot_ext:
+        if self.screen and self.screen_shot_file and self.screen_shot_ext:
             new_file = self.screen_shot_file + '_' + str(self.screen_shot_count) + self.screen_shot_ext
             pygame.image.save(self.screen, new_file)
             self.screen_shot_count += 1
@@ -155,77 +388,180 @@ class Frame(object):
         if 0 <= pos[0] <= self.control_panel_size[0] and 0 <= pos[1] <= self.control_panel_size[1]:
             self.control_panel.click_handler(pos)
         
+    def call_update_handler(self, elapsed):
+        '''
+        Runs the update handler for the elapsed milliseconds in fixed steps.
+        
+        The leftover fraction of a step is kept in interpolation (0 to 1) so
+        the draw handler can place moving objects between two updates.
+        '''
+        if not self.update_handler:
+            return
+        
+        step = 1000./self.update_rate
+        self.update_accumulator += elapsed
+        updates = 0
+        while self.update_accumulator >= step:
+            if updates == self.max_updates:
+                # too far behind, drop the time that can't be caught up
+                self.update_accumulator %= step
+                break
+            self.update_handler()
+            self.update_accumulator -= step
+            updates += 1
+        self.interpolation = self.update_accumulator/step
+        
     def call_draw_handler(self):
-        '''Clears the screen and calls the draw handler'''
-        if self.surface_count or not self.control_panel:
-            self.canvas.draw_background()
-             
-            if self.draw_handler:
+        '''
+        Clears the canvas, calls the draw handler and composites the canvas
+        and the cached control panel onto the screen
+        '''
+        if self.backend == 'none':
+            # nothing is shown, but frames without an update handler simulate in the draw handler
+            if self.draw_handler and not self.update_handler:
                 self.draw_handler(self.canvas)
-             
-            self.screen.blit(self.canvas.Surface,(0,0))
-            
-            self.surface_count = 0
+            return
+        
+        if self.dirty_rects:
+            self.canvas.erase_dirty()
         else:
-            self.control_panel.draw_background()
-            self.control_panel.draw_controls()
-            self.screen.blit(self.control_panel.Surface,(self.canvas_size[0],0))
-            self.surface_count = 1
+            self.canvas.draw_background()
          
+        if self.draw_handler:
+            self.draw_handler(self.canvas)
+        
+        if self.dirty_rects:
+            update_rects = self.canvas.get_update_rects()
+            for rect in update_rects:
+                self.screen.blit(self.canvas.Surface, rect, rect)
+            if len(update_rects) > MAX_DIRTY_RECTS:
+                update_rects = [update_rects[0].unionall(update_rects[1:])]
+        else:
+            update_rects = [self.screen.blit(self.canvas.Surface,(0,0))]
+        
+        # the control panel is only re-rendered when one of its controls changed
+        if self.control_panel and self.control_panel.needs_redraw:
+            self.control_panel.redraw()
+            update_rects.append(self.screen.blit(self.control_panel.Surface,(self.canvas_size[0],0)))
         
         # update the display
-        pygame.display.update()
+        if self.backend == 'window':
+            pygame.display.update(update_rects)
+        
+    def step(self, n=1):
+        '''
+        Advances the frame n ticks without waiting: handles the pending
+        events, runs one fixed update and draws every render_every ticks.
+        Frames without an update handler simulate in the draw handler, so
+        it is called every tick.
+        '''
+        for _ in range(n):
+            for event in self.get_events():
+                self.handle_event(event)
+            
+            self.tick_count += 1
+            if self.update_handler:
+                self.update_handler()
+                # the last update was just run, so draw its positions
+                self.interpolation = 1.
+                if self.render_every and self.tick_count % self.render_every == 0:
+                    self.call_draw_handler()
+            else:
+                self.call_draw_handler()
+        
+    def post_event(self, event):
+        '''Queues an event for a headless frame'''
+        self.events.append(event)
+        
+    def post_key_down(self, key):
+        '''Queues a key down event by key name, like left or space'''
+        self.post_event(pygame.event.Event(pygame.KEYDOWN, key_name=key))
+        
+    def post_key_up(self, key):
+        '''Queues a key up event by key name'''
+        self.post_event(pygame.event.Event(pygame.KEYUP, key_name=key))
+        
+    def post_mouse_click(self, pos, button=1):
+        '''Queues a mouse click, button 1 is left and 3 is right'''
+        self.post_event(pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=tuple(pos), button=button))
+        
+    def post_mouse_move(self, pos):
+        '''Queues a mouse movement'''
+        self.post_event(pygame.event.Event(pygame.MOUSEMOTION, pos=tuple(pos)))
+        
+    def get_events(self):
+        '''Gets the pending events from pygame or, when headless, the posted events'''
+        if self.backend == 'window':
+            return pygame.event.get()
+        events = list(self.events)
+        self.events.clear()
+        return events
+    
+    def handle_event(self, event):
+        '''Calls the handler for an event'''
+        # window GUI ('x' the window)
+        if event.type == pygame.QUIT:
+            self.stop()
+
+        # input - key and mouse event handlers
+        elif event.type == pygame.MOUSEBUTTONDOWN:
+            if event.button == 1:
+                #left clicks
+                if self.mouse_left_click_handler:
+                    self.mouse_left_click_handler(event.pos)
+                
+                if self.control_panel:
+                    self.control_click_handler(event.pos)
+            elif event.button == 3:
+                #right clicks
+                if self.mouse_right_click_handler:
+                    self.mouse_right_click_handler(event.pos)
+                    
+        elif event.type == pygame.MOUSEMOTION:
+            if self.mouse_move_handler:
+                self.mouse_move_handler(event.pos)
+                
+        elif event.type == pygame.KEYDOWN:
+            if self.key_down_handler:
+                self.key_down_handler(key_name(event))
+                
+            if key_name(event) == 'print screen':
+                self.screen_shot()
+                
+        elif event.type == pygame.KEYUP:
+            if self.key_up_handler:
+                self.key_up_handler(key_name(event))
+        
+        # timers
+        #elif event.type == timer_example:
+            #t_example()      
             
     def run(self):
         '''Runs the frame, event handlers, and timers'''
         clock = pygame.time.Clock() 
+        elapsed = 0
         
         while self.running:
+            if self.turbo:
+                # uncapped, one tick per loop
+                self.step()
+                clock.tick()
+                elapsed = 0
+                continue
+            
             # event queue iteration
-            for event in pygame.event.get():
-                
-                # window GUI ('x' the window)
-                if event.type == pygame.QUIT:
-                    self.stop()
-    
-                # input - key and mouse event handlers
-                elif event.type == pygame.MOUSEBUTTONDOWN:
-                    if pygame.mouse.get_pressed()[0]:
-                        #left clicks
-                        if self.mouse_left_click_handler:
-                            self.mouse_left_click_handler(pygame.mouse.get_pos())
-                        
-                        self.control_click_handler(pygame.mouse.get_pos())
-                    elif pygame.mouse.get_pressed()[2]:
-                        #right clicks
-                        if self.mouse_right_click_handler:
-                            self.mouse_right_click_handler(pygame.mouse.get_pos())
-                            
-                elif event.type == pygame.MOUSEMOTION:
-                    if self.mouse_move_handler:
-                        self.mouse_move_handler(pygame.mouse.get_pos())
-                        
-                elif event.type == pygame.KEYDOWN:
-                    if self.key_down_handler:
-                        self.key_down_handler(pygame.key.name(event.key))
-                        
-                    if pygame.key.name(event.key) == 'print screen':
-                        self.screen_shot()
-                        
-                elif event.type == pygame.KEYUP:
-                    if self.key_up_handler:
-                        self.key_up_handler(pygame.key.name(event.key))
-                
-                # timers
-                #elif event.type == timer_example:
-                    #t_example()      
+            for event in self.get_events():
+                self.handle_event(event)
                     
+            # advance the simulation by the time the last frame took
+            self.call_update_handler(elapsed)
+            
             # the call to the draw handler
             self.call_draw_handler()
             
             # FPS limit to 60 -- essentially, setting the draw handler timing
             # it micro pauses so while loop only runs 60 times a second max.
-            clock.tick(self.FPS)
+            elapsed = clock.tick(self.FPS)
             
         #pygame.quit()
     
@@ -241,13 +577,64 @@ class Canvas(object):
         self.Surface = pygame.Surface(size)
         self.background_color = pygame.Color(color)
         self.default_font_h = default_font_h
+        self.track_dirty = False
+        self.dirty_rects = []
+        self.prev_dirty_rects = []
+        self.background_layer = None
                 
     def set_background_color(self, color):
         color = pygame.Color(color) if type(color) == str else color
         self.background_color = color
+        # the whole canvas has to be refilled with the new color
+        self.mark_dirty(self.Surface.get_rect())
          
     def draw_background(self):
-        self.Surface.fill(self.background_color)
+        if self.background_layer:
+            self.background_layer.refresh(self.background_color)
+            self.mark_dirty(self.Surface.blit(self.background_layer.Surface, (0,0)))
+        else:
+            self.mark_dirty(self.Surface.fill(self.background_color))
+        
+    def set_background_layer(self, layer):
+        '''Uses a static layer, drawn over the background color, as the background'''
+        self.background_layer = layer
+        if layer:
+            layer.invalidate()
+        self.mark_dirty(self.Surface.get_rect())
+        
+    def set_dirty_tracking(self, track_dirty):
+        '''Turns recording of the regions touched by the draw calls on or off'''
+        self.track_dirty = track_dirty
+        self.prev_dirty_rects = []
+        self.dirty_rects = [self.Surface.get_rect()] if track_dirty else []
+        
+    def mark_dirty(self, rect):
+        '''Records a region of the canvas that has been drawn on'''
+        if self.track_dirty:
+            rect = rect.clip(self.Surface.get_rect())
+            if rect.width and rect.height:
+                self.dirty_rects.append(rect)
+        return rect
+    
+    def erase_dirty(self):
+        '''Fills last frame's dirty regions with the background and starts a new frame'''
+        layer = self.background_layer
+        if layer:
+            # only the part of the layer that was redrawn is new
+            changed = layer.refresh(self.background_color)
+            if changed:
+                self.dirty_rects.append(changed)
+            for rect in self.dirty_rects:
+                self.Surface.blit(layer.Surface, rect, rect)
+        else:
+            for rect in self.dirty_rects:
+                self.Surface.fill(self.background_color, rect)
+        self.prev_dirty_rects = self.dirty_rects
+        self.dirty_rects = []
+        
+    def get_update_rects(self):
+        '''Regions that changed since the last frame: last frame's and this frame's dirty regions'''
+        return self.prev_dirty_rects + self.dirty_rects
         
     def draw_rect(self, pos, size, line_width, line_color, fill_color = None):
         '''draw a rectangle shape'''
@@ -257,19 +644,19 @@ class Canvas(object):
         
         if fill_color:
             fill_color = pygame.Color(fill_color) if type(fill_color) == str else fill_color
-            pygame.draw.rect(self.Surface, fill_color, Rect, 0)
+            self.mark_dirty(pygame.draw.rect(self.Surface, fill_color, Rect, 0))
                 
         line_color = pygame.Color(line_color) if type(line_color) == str else line_color
-        pygame.draw.rect(self.Surface, line_color, Rect, line_width)
+        self.mark_dirty(pygame.draw.rect(self.Surface, line_color, Rect, line_width))
         
     def draw_polygon(self, point_list, line_width, line_color, fill_color = None):
         '''draw a shape with any number of sides'''
         if fill_color:
             fill_color = pygame.Color(fill_color) if type(fill_color) == str else fill_color
-            pygame.draw.polygon(self.Surface, fill_color, point_list, 0)
+            self.mark_dirty(pygame.draw.polygon(self.Surface, fill_color, point_list, 0))
                 
         line_color = pygame.Color(line_color) if type(line_color) == str else line_color
-        pygame.draw.polygon(self.Surface, line_color, point_list, line_width)
+        self.mark_dirty(pygame.draw.polygon(self.Surface, line_color, point_list, line_width))
         
     def draw_circle(self, pos, radius, line_width, line_color, fill_color = None):
         '''draw a circle around a point'''
@@ -277,10 +664,10 @@ class Canvas(object):
         radius = int(radius)
         if fill_color:
             fill_color = pygame.Color(fill_color) if type(fill_color) == str else fill_color
-            pygame.draw.circle(self.Surface, fill_color, pos, radius, 0)
+            self.mark_dirty(pygame.draw.circle(self.Surface, fill_color, pos, radius, 0))
                 
         line_color = pygame.Color(line_color) if type(line_color) == str else line_color
-        pygame.draw.circle(self.Surface, line_color, pos, radius, line_width)
+        self.mark_dirty(pygame.draw.circle(self.Surface, line_color, pos, radius, line_width))
         
     def draw_ellipse(self, pos, size, line_width, line_color, fill_color = None):
         '''draw a round shape inside a rectangle'''
@@ -290,10 +677,10 @@ class Canvas(object):
         
         if fill_color:
             fill_color = pygame.Color(fill_color) if type(fill_color) == str else fill_color
-            pygame.draw.ellipse(self.Surface, fill_color, Rect, 0)
+            self.mark_dirty(pygame.draw.ellipse(self.Surface, fill_color, Rect, 0))
                 
         line_color = pygame.Color(line_color) if type(line_color) == str else line_color
-        pygame.draw.ellipse(self.Surface, line_color, Rect, line_width)
+        self.mark_dirty(pygame.draw.ellipse(self.Surface, line_color, Rect, line_width))
         
     def draw_arc(self, pos, size, start_angle, stop_angle, width=1, color='White'):
         '''draw a partial section of an ellipse'''
@@ -301,38 +688,40 @@ class Canvas(object):
         size = tuple([int(s) for s in size])
         color = pygame.Color(color) if type(color) == str else color
         Rect = pygame.Rect(pos[0], pos[1], size[0], size[1])
-        pygame.draw.arc(self.Surface, color, Rect, start_angle, stop_angle, width)
+        self.mark_dirty(pygame.draw.arc(self.Surface, color, Rect, start_angle, stop_angle, width))
         
     def draw_line(self, start_pos, end_pos, width=1, color='White'):
         '''draw a straight line segment'''
         start_pos = tuple([int(p) for p in start_pos])
         end_pos = tuple([int(p) for p in end_pos])
         color = pygame.Color(color) if type(color) == str else color
-        pygame.draw.line(self.Surface, color, start_pos, end_pos, width) 
+        self.mark_dirty(pygame.draw.line(self.Surface, color, start_pos, end_pos, width))
         
     def draw_lines(self, closed, pointlist, width=1, color='White'):
         '''draw multiple contiguous line segments'''
-        pygame.draw.lines(self.Surface, color, closed, pointlist, width)
+        self.mark_dirty(pygame.draw.lines(self.Surface, color, closed, pointlist, width))
         
     def draw_aaline(self, start_pos, end_pos, blend=1, color='White'):
         '''draw fine antialiased lines'''
         start_pos = tuple([int(p) for p in start_pos])
         end_pos = tuple([int(p) for p in end_pos])
         color = pygame.Color(color) if type(color) == str else color
-        pygame.draw.aaline(self.Surface, color, start_pos, end_pos, blend)
+        self.mark_dirty(pygame.draw.aaline(self.Surface, color, start_pos, end_pos, blend))
         
     def draw_aalines(self, closed, pointlist, blend=1, color='White'):
         '''draw a connected sequence of antialiased lines'''
         color = pygame.Color(color) if type(color) == str else color
-        pygame.draw.aalines(self.Surface, color, closed, pointlist, blend)
+        self.mark_dirty(pygame.draw.aalines(self.Surface, color, closed, pointlist, blend))
         
     def draw_text(self, text, pos, font_size, font_color, font_face='sans-serif', align=('left','top')):
         '''draw text on the canvas'''
         pos = tuple([int(p) for p in pos])
-        font_color = pygame.Color(font_color) if type(font_color) == str else font_color
-        font = get_font(font_face, font_size)
-        s = font.render(text, True, font_color)
-        size = font.size(text)
+        key = (text, font_face, font_size, font_color if type(font_color) == str else tuple(font_color))
+        s = TEXT_CACHE.get(key)
+        if s is None:
+            font_color = pygame.Color(font_color) if type(font_color) == str else font_color
+            s = TEXT_CACHE.put(key, get_font(font_face, font_size).render(text, True, font_color))
+        size = s.get_size()
         
         if align[0] in ALIGNMENTS[0] and align[1] in ALIGNMENTS[1]:
             pos = (pos[0] - ALIGNMENTS[0].index(align[0])*0.5*size[0],
@@ -340,18 +729,102 @@ class Canvas(object):
         else:
             raise('invalid alignment in draw_text')
         
-        self.Surface.blit(s, pos)
+        self.mark_dirty(self.Surface.blit(s, pos))
         
-    def draw_image(self, image, pos, angle=0):
-        '''draws an image on the canvas'''
+    def draw_image(self, image, pos, angle=0, size=None):
+        '''draws an image on the canvas, rotated by angle and scaled to size if given'''
         pos = tuple([int(p) for p in pos])
-        rot_img = pygame.transform.rotate(image.img, angle)
-        self.Surface.blit(rot_img, pos)
+        self.mark_dirty(self.Surface.blit(image.transformed(angle, size), pos))
+        
+    def mark_dirty_batch(self, rects):
+        '''Records the bounding region of a batch of drawn rectangles'''
+        if self.track_dirty and rects:
+            self.mark_dirty(rects[0].unionall(rects[1:]))
+        
+    def draw_rects(self, rects, line_width, line_color, fill_color = None):
+        '''draw a batch of (x, y, width, height) rectangles sharing their colors'''
+        line_color = pygame.Color(line_color) if type(line_color) == str else line_color
+        if fill_color:
+            fill_color = pygame.Color(fill_color) if type(fill_color) == str else fill_color
+        
+        changed = []
+        if line_width == 0:
+            # a zero width line fills the rectangle, covering any fill color
+            for rect in rects:
+                changed.append(self.Surface.fill(line_color, rect))
+        else:
+            for rect in rects:
+                if fill_color:
+                    changed.append(self.Surface.fill(fill_color, rect))
+                changed.append(pygame.draw.rect(self.Surface, line_color, rect, line_width))
+        self.mark_dirty_batch(changed)
+        
+    def draw_circles(self, centers, radius, line_width, line_color, fill_color = None):
+        '''draw a batch of (x, y) centered circles sharing their radius and colors'''
+        radius = int(radius)
+        line_color = pygame.Color(line_color) if type(line_color) == str else line_color
+        if fill_color:
+            fill_color = pygame.Color(fill_color) if type(fill_color) == str else fill_color
+        
+        changed = []
+        for center in centers:
+            if fill_color:
+                changed.append(pygame.draw.circle(self.Surface, fill_color, center, radius, 0))
+            changed.append(pygame.draw.circle(self.Surface, line_color, center, radius, line_width))
+        self.mark_dirty_batch(changed)
+        
+    def draw_images(self, batch):
+        '''draws a batch of (image, pos, angle) on the canvas with one blits call'''
+        blit_sequence = [(image.transformed(angle), (int(pos[0]), int(pos[1]))) for image, pos, angle in batch]
+        self.mark_dirty_batch(self.Surface.blits(blit_sequence))
     
     def __repr__(self):
         '''Returns the class of the object and its fields'''
         return '%s(%r)' % (self.__class__, self.__dict__)
     
+class StaticLayer(Canvas):
+    '''
+    Canvas for drawing that rarely changes, like settled blocks, that is kept
+    between frames as the background of another canvas. The draw handler is
+    only called to redraw the regions that have been invalidated.
+    '''
+    
+    def __init__(self, size, draw_handler):
+        '''Creates the layer, which is drawn when it is first used'''
+        super(StaticLayer, self).__init__(size)
+        self.draw_handler = draw_handler
+        self.invalid_rects = [self.Surface.get_rect()]
+        
+    def invalidate(self, rect=None):
+        '''Marks a (left, top, width, height) region, or the whole layer, to be redrawn'''
+        rect = self.Surface.get_rect() if rect is None else pygame.Rect(rect)
+        self.invalid_rects.append(rect)
+        if len(self.invalid_rects) > MAX_DIRTY_RECTS:
+            self.invalid_rects = [self.invalid_rects[0].unionall(self.invalid_rects[1:])]
+        
+    def refresh(self, background_color):
+        '''
+        Redraws the invalid region over the background color, or the whole
+        layer if the color changed. Returns the redrawn region or None.
+        '''
+        if background_color != self.background_color:
+            self.background_color = background_color
+            self.invalidate()
+        if not self.invalid_rects:
+            return None
+        
+        region = self.invalid_rects[0].unionall(self.invalid_rects[1:]).clip(self.Surface.get_rect())
+        self.invalid_rects = []
+        self.Surface.set_clip(region)
+        self.Surface.fill(self.background_color)
+        self.draw_handler(self)
+        self.Surface.set_clip(None)
+        return region
+    
+    def get_clip(self):
+        '''The region being redrawn, so draw handlers can skip what is outside it'''
+        return self.Surface.get_clip()
+        
 class ControlPanel(Canvas):
     '''Creates a control panel'''
     
@@ -360,6 +833,7 @@ class ControlPanel(Canvas):
         super(ControlPanel, self).__init__(size, color, default_font_h)
         self.controls = []
         self.spacing = 5
+        self.needs_redraw = True
         
     
     def get_offset(self):
@@ -370,8 +844,9 @@ class ControlPanel(Canvas):
     
     def add_button(self, text, handler, width, font_height):
         '''Adds a button to the control panel'''
-        button = Button(text, handler, self.offset, width, font_height)
+        button = Button(text, handler, self.offset, width, font_height, panel=self)
         self.controls.append(button)
+        self.invalidate()
         return button
         
     def add_label(self, text,  width=None, font_height=None):
@@ -381,14 +856,16 @@ class ControlPanel(Canvas):
         if not font_height:
             font_height = self.default_font_h
         
-        label = Label(text, self.offset, width, font_height)
+        label = Label(text, self.offset, width, font_height, panel=self)
         self.controls.append(label)
+        self.invalidate()
         return label
         
     def add_sprite_container(self, sprite, size=None):
         '''Adds a sprite to the control panel'''
-        sprite_container = Sprite_Container(sprite, self.offset, size=size)
+        sprite_container = Sprite_Container(sprite, self.offset, size=size, panel=self)
         self.controls.append(sprite_container)
+        self.invalidate()
         return sprite_container
         
     def draw_controls(self):
@@ -396,6 +873,16 @@ class ControlPanel(Canvas):
         for control in self.controls:
             control.draw(self)
             
+    def invalidate(self):
+        '''Marks the control panel as needing to be re-rendered'''
+        self.needs_redraw = True
+        
+    def redraw(self):
+        '''Re-renders the background and controls into the panel's surface'''
+        self.draw_background()
+        self.draw_controls()
+        self.needs_redraw = False
+            
     def click_handler(self, click_pos):
         '''Calls the control that was clicked on by a position'''
         for control in self.controls:
@@ -409,8 +896,9 @@ class ControlPanel(Canvas):
 class Button(object):
     '''Creates a button.'''
     
-    def __init__(self, text, handler, pos, width, font_height, color = 'grey'):
+    def __init__(self, text, handler, pos, width, font_height, color = 'grey', panel=None):
         '''Initializes the button'''
+        self.panel = panel
         self.text = text
         self.handler = handler
         self.pos = pos
@@ -418,6 +906,30 @@ class Button(object):
         self.size = (width, 2*self.font_h)
         self.color = color
     
+    def set_text(self, text):
+        '''Sets the button text'''
+        self._text = text
+        if self.panel:
+            self.panel.invalidate()
+            
+    def get_text(self):
+        '''Gets the button text'''
+        return self._text
+    
+    text = property(get_text, set_text)
+    
+    def set_color(self, color):
+        '''Sets the button color'''
+        self._color = color
+        if self.panel:
+            self.panel.invalidate()
+            
+    def get_color(self):
+        '''Gets the button color'''
+        return self._color
+    
+    color = property(get_color, set_color)
+    
     def call_handler(self):
         '''Calls the button's event handler'''
         if self.handler:
@@ -439,12 +951,25 @@ class Button(object):
 class Label(object):
     '''Creates a Label.'''
     
-    def __init__(self, text, pos, width, font_height):
+    def __init__(self, text, pos, width, font_height, panel=None):
         '''Initializes the label'''
+        self.panel = panel
         self.text = text
         self.pos = pos
         self.font_h = font_height
         self.size = (width, 2*self.font_h)
+        
+    def set_text(self, text):
+        '''Sets the label text'''
+        self._text = text
+        if self.panel:
+            self.panel.invalidate()
+            
+    def get_text(self):
+        '''Gets the label text'''
+        return self._text
+    
+    text = property(get_text, set_text)
     
     def draw(self, canvas):
         '''Draws the label'''
@@ -456,8 +981,9 @@ class Label(object):
            
 class Sprite_Container(object):
     '''Creates a container for a sprite'''
-    def __init__(self, sprite, pos, size=None):
+    def __init__(self, sprite, pos, size=None, panel=None):
         '''Initializes the container'''
+        self.panel = panel
         self.pos = pos
         self.sprite = sprite
         self._size = size
@@ -467,6 +993,8 @@ class Sprite_Container(object):
         self._sprite = sprite
         if self._sprite:
             self._sprite.pos = self.pos
+        if self.panel:
+            self.panel.invalidate()
             
     def get_sprite(self):
         '''Gets the sprite'''
@@ -530,16 +1058,112 @@ class Image_Info(object):
         '''Returns the class of the object and its fields'''
         return 'Image_Info(img_file={0!r}, size={1!r})'.format(self.img_file, self.size)
     
+class Atlas(object):
+    '''
+    One image holding many smaller images, read from the atlas file and the
+    index of where each image is in it, by path from the atlas's directory
+    '''
+    def __init__(self, img_file=ATLAS_FILE, index_file=ATLAS_INDEX_FILE):
+        '''Reads the index and decodes the atlas image'''
+        self.img_file = img_file
+        self.image_dir = os.path.dirname(img_file)
+        self.rects = dict([])
+        with open(index_file) as index:
+            for line in index:
+                fields = line.rsplit(None, 4)
+                if fields:
+                    self.rects[fields[0]] = pygame.Rect([int(f) for f in fields[1:5]])
+        self.img = pygame.image.load(img_file)
+        self.converted = False
+        
+    def image_name(self, img_file):
+        '''The name of the image file in the index, its path from the atlas's directory'''
+        return os.path.relpath(img_file, self.image_dir).replace(os.sep, '/')
+        
+    def has_image(self, img_file):
+        '''Checks if the image file is packed in the atlas'''
+        return self.image_name(img_file) in self.rects
+        
+    def load(self, img_file):
+        '''Gets the image file's part of the atlas, sharing the atlas pixels'''
+        # converting needs a display, so the atlas is converted the first time an image is used
+        if not self.converted and pygame.display.get_surface():
+            self.img = self.img.convert_alpha()
+            self.converted = True
+        return self.img.subsurface(self.rects[self.image_name(img_file)])
+    
+    def __repr__(self):
+        '''Returns the atlas file and number of images'''
+        return 'Atlas(img_file={0!r}, images={1!r})'.format(self.img_file, len(self.rects))
+    
 class Image(object):
     '''Loads an image into the game'''
-    def __init__(self, img_info):
-        '''Constructor'''
+    def __init__(self, img_info, cache_bytes=IMAGE_CACHE_BYTES, loader=pygame.image.load, lazy=False):
+        '''
+        Constructor, loader(img_file) reads the image file and lazy waits
+        to load it until it is first drawn
+        '''
         self.img_info = img_info
-        self.img = pygame.image.load(img_info.img_file).convert_alpha()
+        self.loader = loader
+        self.cache = SurfaceCache(cache_bytes)
+        self._img = None
+        self.rotations = None
+        if not lazy:
+            self.load()
+        
+    def load(self):
+        '''Loads the image file, if it is not loaded yet'''
+        if self._img is None:
+            img = self.loader(self.img_info.img_file)
+            # converting needs a display, headless frames use the image as loaded,
+            # atlas images share the atlas pixels, which are already converted
+            if pygame.display.get_surface() and img.get_parent() is None:
+                img = img.convert_alpha()
+            self._img = img
+            self.make_rotations()
+    
+    def get_img(self):
+        '''Gets the image surface, loading it if needed'''
+        self.load()
+        return self._img
+    
+    img = property(get_img)
+    
+    def is_loaded(self):
+        '''Checks if the image file has been loaded'''
+        return self._img is not None
+        
+    def make_rotations(self):
+        '''Scales and rotates the quarter turns once, since they are drawn the most'''
+        scaled = self.scaled(self.img_info.size)
+        self.rotations = (scaled,) + tuple([pygame.transform.rotate(scaled, 90*rot) for rot in range(1,4)])
+    
+    def scaled(self, size):
+        '''The image scaled to the size'''
+        size = tuple([int(s) for s in size])
+        if size == self.img.get_size():
+            return self.img
+        return pygame.transform.scale(self.img, size)
+    
+    def transformed(self, angle=0, size=None):
+        '''The image scaled to the size, the image info size by default, and rotated counterclockwise by the angle in degrees'''
+        if self.rotations is None:
+            self.load()
+        if size is None or tuple(size) == tuple(self.img_info.size):
+            if angle % 90 == 0:
+                return self.rotations[int(angle // 90) % 4]
+            size = self.img_info.size
+        key = (angle % 360, tuple(size))
+        surface = self.cache.get(key)
+        if surface is None:
+            surface = self.cache.put(key, pygame.transform.rotate(self.scaled(size), angle))
+        return surface
         
     def set_size(self, size):
         '''Set the image size'''
         self.img_info.size = size
+        if self.is_loaded():
+            self.make_rotations()
     
     def get_size(self):
         '''Get the image size'''
@@ -547,7 +1171,7 @@ class Image(object):
     
     def __repr__(self):
         '''Returns the class of the object and its fields'''
-        return 'Image(img_info={0!r})'.format(self.img_info)
+        return 'Image(img_info={0!r}, cache={1!r})'.format(self.img_info, self.cache)
         
         
 if __name__ == '__main__':
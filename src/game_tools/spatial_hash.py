@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+'''
+Spatial hash for finding the sprites near a position without scanning all of them
+
+Created on Oct 18, 2026
+
+@author: Robb
+'''
+
+class SpatialHash(object):
+    '''
+    Uniform grid index of sprites, keyed by the cells their rectangles cover
+    '''
+
+    def __init__(self, cell_size, sprites=()):
+        '''Creates the index with (width, height) cells and adds the sprites'''
+        self.cell_size = tuple(cell_size)
+        self.cells = {}
+        self.sprite_cells = {}
+        for the_sprite in sprites:
+            self.add(the_sprite)
+
+    def cells_for(self, pos, size):
+        '''The (col, row) cells covered by a rectangle centered at pos'''
+        col_low = int((pos[0] - 0.5*size[0]) // self.cell_size[0])
+        col_high = int((pos[0] + 0.5*size[0]) // self.cell_size[0])
+        row_low = int((pos[1] - 0.5*size[1]) // self.cell_size[1])
+        row_high = int((pos[1] + 0.5*size[1]) // self.cell_size[1])
+        return [(col, row) for col in range(col_low, col_high + 1) for row in range(row_low, row_high + 1)]
+
+    def add(self, the_sprite):
+        '''Adds a sprite at its current position and size'''
+        cells = self.cells_for(the_sprite.pos, the_sprite.size)
+        self.sprite_cells[the_sprite] = cells
+        for cell in cells:
+            self.cells.setdefault(cell, []).append(the_sprite)
+
+    def remove(self, the_sprite):
+        '''Removes a sprite from the cells it was added to'''
+        for cell in self.sprite_cells.pop(the_sprite):
+            cell_sprites = self.cells[cell]
+            cell_sprites.remove(the_sprite)
+            if not cell_sprites:
+                del self.cells[cell]
+
+    def move(self, the_sprite):
+        '''Re-indexes a sprite after its position or size changed'''
+        self.remove(the_sprite)
+        self.add(the_sprite)
+
+    def query(self, pos, size):
+        '''The sprites sharing a cell with a rectangle centered at pos, each listed once'''
+        found = []
+        seen = set()
+        for cell in self.cells_for(pos, size):
+            for the_sprite in self.cells.get(cell, ()):
+                if the_sprite not in seen:
+                    seen.add(the_sprite)
+                    found.append(the_sprite)
+        return found
+
+    def query_sprite(self, the_sprite):
+        '''The other sprites sharing a cell with a sprite'''
+        return [other for other in self.query(the_sprite.pos, the_sprite.size) if other is not the_sprite]
+
+    def __contains__(self, the_sprite):
+        '''Checks if the sprite is in the index'''
+        return the_sprite in self.sprite_cells
+
+    def __len__(self):
+        '''Number of sprites in the index'''
+        return len(self.sprite_cells)
+
+    def __iter__(self):
+        '''Iterates over the indexed sprites'''
+        return iter(self.sprite_cells)
+
+    def __repr__(self):
+        '''Returns the cell size and counts'''
+        return 'SpatialHash(cell_size={0!r}, sprites={1!r}, cells={2!r})'.format(self.cell_size, len(self), len(self.cells))
@@ -7,10 +7,24 @@ Created on Jun 11, 2014
 @author: Robb
 '''
 
-class Sprite(object):
+try:
+    import numpy
+except ImportError:
+    # only SpriteGroup needs numpy
+    numpy = None
+
+# rotation matrices for rot 0 to 3 quarter turns
+ROT_MATS = (((1,0),(0,1)),
+            ((0,1),(-1,0)),
+            ((-1,0),(0,-1)),
+            ((0,-1),(1,0)))
+
+class SpriteBase(object):
     '''
-    Sprite object for drawing and moving around the game canvas
+    Fields and methods shared by Sprite and CompactSprite
     '''
+    
+    __slots__ = ()
 
     def __init__(self, name=None, pos=[0,0], vel=[0,0], rot=0, size=(10,10), color='White', line_color='Black', line_width=1, life=None, image=None, draw_method=None, update_method=None):
         '''
@@ -32,7 +46,7 @@ class Sprite(object):
         
     def set_pos(self, pos):
         '''Sets the position of the sprite'''
-        self._pos = tuple(pos)
+        self._pos = pos if type(pos) is tuple else tuple(pos)
     
     def get_pos(self):
         '''Gets the position of the sprite'''
@@ -42,7 +56,7 @@ class Sprite(object):
     
     def set_vel(self, vel):
         '''Sets the velocity of the sprite'''
-        self._vel = tuple(vel)
+        self._vel = vel if type(vel) is tuple else tuple(vel)
          
     def get_vel(self):
         '''Gets the velocity of the sprite'''
@@ -55,26 +69,21 @@ class Sprite(object):
         self.rot = (self.rot + direction) % 4
         
     def get_rot_mat(self):
-        if self.rot == 0:
-            rot_mat = [[1,0],[0,1]]
-        elif self.rot == 1:
-            rot_mat = [[0,1],[-1,0]]
-        elif self.rot == 2:
-            rot_mat = [[-1,0],[0,-1]]
-        elif self.rot == 3:
-            rot_mat = [[0,-1],[1,0]]
-        return rot_mat
+        '''Gets the rotation matrix for the sprite's rotation'''
+        return ROT_MATS[self.rot]
     
     rot_mat = property(get_rot_mat)
     
     def rotate_offset(self, offset):
         '''Rotates an offset vector around the center point by the sprite's rotation'''
-        return [self.pos[0] + self.rot_mat[0][0]*offset[0]+self.rot_mat[0][1]*offset[1],
-                self.pos[1] + self.rot_mat[1][0]*offset[0]+self.rot_mat[1][1]*offset[1]]
+        rot_mat = ROT_MATS[self.rot]
+        pos = self.pos
+        return [pos[0] + rot_mat[0][0]*offset[0]+rot_mat[0][1]*offset[1],
+                pos[1] + rot_mat[1][0]*offset[0]+rot_mat[1][1]*offset[1]]
     
     def set_size(self, size):
         '''Sets the size of the sprite'''
-        self._size = tuple(size)
+        self._size = size if type(size) is tuple else tuple(size)
          
     def get_size(self):
         '''Gets the size of the sprite'''
@@ -100,11 +109,7 @@ class Sprite(object):
     def draw(self, canvas, default=False):
         '''Draws the sprite'''
         if self.image and not default:
-            #place holder for drawing the sprite's image
-            canvas.draw_image(self.image, 
-                              [self.pos[0]-0.5*self.image.get_size()[0],
-                               self.pos[1]-0.5*self.image.get_size()[1]],
-                              self.rot*90)
+            canvas.draw_image(*self.image_blit())
         elif self.draw_method and not default:
             self.draw_method(self, canvas)
         else:
@@ -113,6 +118,18 @@ class Sprite(object):
                               self.pos[1]-0.5*self.size[1]],
                               self.size, self.line_width, self.line_color, self.color)
     
+    def get_bounds(self):
+        '''The (left, top, width, height) of the area the sprite draws on'''
+        size = self.image.get_size() if self.image else self.size
+        return (int(self.pos[0]-0.5*size[0]) - 1, int(self.pos[1]-0.5*size[1]) - 1, int(size[0]) + 2, int(size[1]) + 2)
+    
+    def image_blit(self):
+        '''The (image, top left position, angle) to draw the sprite's image'''
+        return (self.image,
+                [self.pos[0]-0.5*self.image.get_size()[0],
+                 self.pos[1]-0.5*self.image.get_size()[1]],
+                self.rot*90)
+    
     def contains(self, pos):
         '''Returns true if the position is contained in the sprite's rectangle'''
         return (-0.5*self.size[0] <= pos[0] - self.pos[0] < 0.5*self.size[0]) \
@@ -132,7 +149,28 @@ class Sprite(object):
             
     def __repr__(self):
         '''Returns the class of the object and its fields'''
-        return 'Sprite(name={0!r}, pos={1!r}, vel={2!r}, rot={3!r}, size={4!r}, color={5!r}, line_color={6!r}, line_width={7!r}, image={8!r}, draw_method={9!r}, update_method={10!r})'.format(self.name, self.pos, self.vel, self.rot, self.size, self.color, self.line_color, self.line_width, self.image, self.draw_method, self.update_method)
+        return '{11}(name={0!r}, pos={1!r}, vel={2!r}, rot={3!r}, size={4!r}, color={5!r}, line_color={6!r}, line_width={7!r}, image={8!r}, draw_method={9!r}, update_method={10!r})'.format(self.name, self.pos, self.vel, self.rot, self.size, self.color, self.line_color, self.line_width, self.image, self.draw_method, self.update_method, self.__class__.__name__)
+    
+class Sprite(SpriteBase):
+    '''
+    Sprite object for drawing and moving around the game canvas
+    '''
+    
+class CompactSprite(SpriteBase):
+    '''
+    Sprite without an instance dictionary for large numbers of sprites, like
+    bricks, snake segments and world blocks. It has the same fields and
+    methods as Sprite but can't be given new attributes.
+    '''
+    
+    __slots__ = ('name', '_pos', '_vel', 'rot', '_size', 'color', 'line_color', 'line_width',
+                 'life', 'image', 'draw_method', 'update_method')
+    
+def rotation_table(offsets):
+    '''The offsets rotated by each of the four quarter turns, indexed by rot'''
+    return tuple(tuple((rot_mat[0][0]*offset[0]+rot_mat[0][1]*offset[1],
+                        rot_mat[1][0]*offset[0]+rot_mat[1][1]*offset[1]) for offset in offsets)
+                 for rot_mat in ROT_MATS)
     
 def draw_circle(circle, canvas):
     '''draws a circle'''
@@ -142,6 +180,39 @@ def draw_name(sprite, canvas):
     '''draws the name of the sprite on the canvas'''
     canvas.draw_text(sprite.name, sprite.pos, sprite.size[1], sprite.color, align=('center','middle'))
 
+def draw_sprites(canvas, sprites, offset=None):
+    '''
+    Draws the sprites in order, blitting each run of sprites with images as
+    one batch. The offset moves them on the canvas, like for drawing world
+    positions through a camera.
+    '''
+    batch = []
+    for the_sprite in sprites:
+        if the_sprite.image:
+            blit = the_sprite.image_blit()
+            if offset:
+                blit = (blit[0], [blit[1][0]+offset[0], blit[1][1]+offset[1]], blit[2])
+            batch.append(blit)
+        else:
+            if batch:
+                canvas.draw_images(batch)
+                batch = []
+            if offset:
+                draw_moved(the_sprite, canvas, offset)
+            else:
+                the_sprite.draw(canvas)
+    if batch:
+        canvas.draw_images(batch)
+
+def draw_moved(the_sprite, canvas, offset):
+    '''Draws the sprite moved by the offset, putting it back afterwards'''
+    pos = the_sprite.pos
+    the_sprite.pos = (pos[0]+offset[0], pos[1]+offset[1])
+    try:
+        the_sprite.draw(canvas)
+    finally:
+        the_sprite.pos = pos
+
 def update_bounce(the_sprite, world_size):
     '''Bounces off the edge of the world'''
     the_sprite.move(the_sprite.vel)
@@ -157,10 +228,164 @@ def update_toroid(the_sprite, world_size):
 
 def update_stay_in_world(the_sprite, world_size):
     '''Keeps the sprite from moving out of the world'''
-    stay_in_vel = [0 if (p+v-0.5*s < 0 or p+v+0.5*s > w) else v for p, v, s, w in zip(the_sprite.pos, the_sprite.vel, the_sprite.size, world_size)]
-    the_sprite.vel = stay_in_vel
+    the_sprite.vel = stay_in_world_vel(the_sprite, world_size)
     the_sprite.move(the_sprite.vel)
     
+def stay_in_world_vel(the_sprite, world_size):
+    '''The sprite's velocity, stopped on the axes where it would move out of the world'''
+    return [0 if (p+v-0.5*s < 0 or p+v+0.5*s > w) else v for p, v, s, w in zip(the_sprite.pos, the_sprite.vel, the_sprite.size, world_size)]
+    
 def check_bounce(rel_dist, rel_v):
     '''Determines if a bounce should happen (one dimensional)'''
-    return rel_dist < 0 and rel_v < 0
\ No newline at end of file
+    return rel_dist < 0 and rel_v < 0
+
+class SpriteGroup(object):
+    '''
+    Many sprites sharing their look and update method, stored as a
+    structure of numpy arrays so they are updated with vectorized operations
+    and drawn as batches.
+    
+    The update method is one of update_bounce, update_toroid,
+    update_stay_in_world or None to just move. The draw shape is 'rect',
+    'circle' or 'image'.
+    '''
+    
+    def __init__(self, capacity=1024, color='White', line_color='Black', line_width=1, image=None, draw_shape='rect', update_method=None):
+        '''Creates an empty group with room for capacity sprites before growing'''
+        if numpy is None:
+            raise ImportError('SpriteGroup needs numpy')
+        if update_method not in GROUP_UPDATE_METHODS:
+            raise ValueError('No vectorized version of update method: ' + repr(update_method))
+        
+        self.count = 0
+        self._pos = numpy.zeros((capacity, 2))
+        self._vel = numpy.zeros((capacity, 2))
+        self._size = numpy.zeros((capacity, 2))
+        self._life = numpy.zeros(capacity)
+        
+        self.color = color
+        self.line_color = line_color
+        self.line_width = line_width
+        self.image = image
+        self.draw_shape = draw_shape
+        self.update_method = update_method
+        
+    def get_pos(self):
+        '''Positions of the sprites as an (n, 2) array view'''
+        return self._pos[:self.count]
+    
+    pos = property(get_pos)
+    
+    def get_vel(self):
+        '''Velocities of the sprites as an (n, 2) array view'''
+        return self._vel[:self.count]
+    
+    vel = property(get_vel)
+    
+    def get_size(self):
+        '''Sizes of the sprites as an (n, 2) array view'''
+        return self._size[:self.count]
+    
+    size = property(get_size)
+    
+    def get_life(self):
+        '''Remaining lives of the sprites, inf for those that never expire'''
+        return self._life[:self.count]
+    
+    life = property(get_life)
+    
+    def __len__(self):
+        '''Number of sprites in the group'''
+        return self.count
+        
+    def grow(self):
+        '''Doubles the capacity of the arrays'''
+        capacity = 2*max(len(self._life), 1)
+        for name in ('_pos', '_vel', '_size', '_life'):
+            old = getattr(self, name)
+            new = numpy.zeros((capacity,) + old.shape[1:])
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+            
+    def add(self, pos, vel=(0,0), size=(10,10), life=None):
+        '''Adds a sprite and returns its index'''
+        if self.count == len(self._life):
+            self.grow()
+        i = self.count
+        self._pos[i] = pos
+        self._vel[i] = vel
+        self._size[i] = size
+        # sprites without a life never expire
+        self._life[i] = numpy.inf if life is None else life
+        self.count += 1
+        return i
+    
+    def add_sprite(self, the_sprite):
+        '''Adds the position, velocity, size and life of a sprite'''
+        return self.add(the_sprite.pos, the_sprite.vel, the_sprite.size, the_sprite.life)
+    
+    def remove_expired(self):
+        '''Removes the sprites whose life has run out, keeping the order of the rest'''
+        alive = self._life[:self.count] > 0
+        count = int(alive.sum())
+        if count < self.count:
+            for array in (self._pos, self._vel, self._size, self._life):
+                array[:count] = array[:self.count][alive]
+            self.count = count
+    
+    def update(self, world_size=None):
+        '''Updates all the sprites' positions and lives, inside the world size unless they just move'''
+        if world_size is None and self.update_method is not None:
+            raise ValueError('{0} needs the world size'.format(self.update_method.__name__))
+        GROUP_UPDATE_METHODS[self.update_method](self, world_size)
+        self.life[:] -= 1
+        self.remove_expired()
+        
+    def draw(self, canvas):
+        '''Draws the sprites as one batch'''
+        if self.count == 0:
+            return
+        corners = (self.pos - 0.5*self.size).astype(int)
+        if self.draw_shape == 'image':
+            canvas.draw_images([(self.image, corner, 0) for corner in corners.tolist()])
+        elif self.draw_shape == 'circle':
+            canvas.draw_circles(self.pos.astype(int).tolist(), self.size[0][0]/2, self.line_width, self.line_color, self.color)
+        else:
+            rects = numpy.hstack((corners, self.size.astype(int))).tolist()
+            canvas.draw_rects(rects, self.line_width, self.line_color, self.color)
+            
+    def __repr__(self):
+        '''Returns the group's look and sprite count'''
+        return 'SpriteGroup(count={0!r}, color={1!r}, line_color={2!r}, line_width={3!r}, image={4!r}, draw_shape={5!r}, update_method={6!r})'.format(self.count, self.color, self.line_color, self.line_width, self.image, self.draw_shape, self.update_method)
+
+def group_update_move(group, world_size):
+    '''Moves every sprite in the group by its velocity'''
+    group.pos[:] += group.vel
+    
+def group_update_bounce(group, world_size):
+    '''Vectorized update_bounce'''
+    pos, vel = group.pos, group.vel
+    pos += vel
+    half = 0.5*group.size
+    bounce = ((pos - half < 0) & (vel < 0)) | ((numpy.asarray(world_size) - pos - half < 0) & (vel > 0))
+    vel[bounce] *= -1
+    
+def group_update_toroid(group, world_size):
+    '''Vectorized update_toroid'''
+    pos = group.pos
+    pos += group.vel
+    pos %= numpy.asarray(world_size, dtype=float)
+    
+def group_update_stay_in_world(group, world_size):
+    '''Vectorized update_stay_in_world'''
+    pos, vel = group.pos, group.vel
+    half = 0.5*group.size
+    new_pos = pos + vel
+    vel[(new_pos - half < 0) | (new_pos + half > numpy.asarray(world_size))] = 0
+    pos += vel
+
+# vectorized versions of the sprite update methods
+GROUP_UPDATE_METHODS = {None: group_update_move,
+                        update_bounce: group_update_bounce,
+                        update_toroid: group_update_toroid,
+                        update_stay_in_world: group_update_stay_in_world}
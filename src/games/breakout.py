@@ -8,7 +8,10 @@ Created on Jun 28, 2014
 '''
 
 from game_tools import simplegui
+from game_tools import assets
 from game_tools import sprite
+from game_tools import spatial_hash
+from game_tools import collision
 import random
 import math
 
@@ -42,9 +45,11 @@ game_over = False
 game_paused = False
 
 brick_rows = []
+brick_index = None
 ball = None
 paddle = None
 gutter = None
+walls = collision.world_walls((WIDTH,HEIGHT), 'ltr')
 
 level = 1
 score = 0
@@ -57,25 +62,12 @@ images = dict([])
 
 control_state = dict([('left',False),('right',False)])
 
-def draw(canvas):
-    '''Draws the board, bricks, paddle, and ball'''
-    global brick_rows, ball, paddle, game_over, cnt, multiplier, level, ball_speed
+def update():
+    '''Moves the ball and paddle, breaks bricks and starts new levels'''
+    global brick_rows, brick_index, paddle, cnt, level, ball_speed
     if not game_paused and not game_over:
         cnt = (cnt + 1) % COUNT_FULL
         
-        if gutter and ball and ball.overlaps(gutter):
-            if len(spare_balls) > 0:
-                spare_balls.pop()
-                ball = new_ball()
-                multiplier = 1
-            else:
-                game_over = True
-                ball = None
-                
-        if ball:
-            keep_score(paddle_bounce(paddle, ball), bricks_bounce(brick_rows, ball))
-                
-            ball.update((WIDTH,HEIGHT))
         if paddle:
             if control_state['left']:
                 paddle.vel = (-PADDLE_SPEED,0)
@@ -83,12 +75,41 @@ def draw(canvas):
                 paddle.vel = (PADDLE_SPEED,0)
             else:
                 paddle.vel = (0,0)
+            # the ball is swept against where the paddle moves this tick
+            paddle.vel = sprite.stay_in_world_vel(paddle, (WIDTH,HEIGHT))
             
+        if ball:
+            for hit_time, normal, target in collision.sweep_sprite(ball, [paddle, gutter] + walls + nearby_bricks(ball), ball_bounce):
+                if target is gutter:
+                    lose_ball()
+                    break
+                elif target is paddle:
+                    keep_score(True, None)
+                elif target in brick_index:
+                    keep_score(False, break_brick(target))
+                
+        if paddle:
             paddle.update((WIDTH,HEIGHT))
     
-    for brick_row in brick_rows:
-        for brick in brick_row:
-            brick.draw(canvas)
+    remove_point_sprites = []
+    for point_sprite in point_sprites:
+        point_sprite.update()
+        if point_sprite.life == 0:
+            remove_point_sprites.append(point_sprite)
+    for point_sprite in remove_point_sprites:
+        point_sprites.remove(point_sprite)
+        
+    if len(brick_index) == 0 and continuous_to_grid(ball.pos)[1]>NUM_ROWS+TOP_GAP+1:
+        brick_rows = new_bricks()
+        brick_index = index_bricks(brick_rows)
+        paddle = new_paddle(paddle.pos, [paddle.size[0]*0.75,paddle.size[1]])
+        level += 1
+        ball_speed += 1
+        spare_balls.append(make_spare_ball(len(spare_balls)))
+
+def draw(canvas):
+    '''Draws the board, bricks, paddle, and ball'''
+    sprite.draw_sprites(canvas, [brick for brick_row in brick_rows for brick in brick_row])
     
     if paddle:
         paddle.draw(canvas)
@@ -102,39 +123,27 @@ def draw(canvas):
     for spare in spare_balls:
         spare.draw(canvas)
     
-    remove_point_sprites = []
     for point_sprite in point_sprites:
-        point_sprite.update()
         point_sprite.draw(canvas)
-        if point_sprite.life == 0:
-            remove_point_sprites.append(point_sprite)
-    for point_sprite in remove_point_sprites:
-        point_sprites.remove(point_sprite)
         
     if game_over:
         canvas.draw_rect([0.25*WIDTH,0.5*HEIGHT-40],[0.5*WIDTH,2*40],2,'Black','Gray')
         canvas.draw_text('GAME OVER',[WIDTH/2,HEIGHT/2],40,'White',align=('center','middle'))
         
-    if sum([len(brick_row) for brick_row in brick_rows]) == 0 and continuous_to_grid(ball.pos)[1]>NUM_ROWS+TOP_GAP+1:
-        brick_rows = new_bricks()
-        paddle = new_paddle(paddle.pos, [paddle.size[0]*0.75,paddle.size[1]])
-        level += 1
-        ball_speed += 1
-        spare_balls.append(make_spare_ball(len(spare_balls)))
-        
     if AUTO_SCREEN_SHOT and cnt == 0 and not game_paused and not game_over:
         frame.screen_shot()
     
 
 def new_game():
     '''Resets the board'''
-    global brick_rows, paddle, ball, spare_balls, gutter, game_over, point_sprites, score, level
+    global brick_rows, brick_index, paddle, ball, spare_balls, gutter, game_over, point_sprites, score, level
     game_over = False
     
     score = 0
     level = 1
     
     brick_rows = new_bricks()
+    brick_index = index_bricks(brick_rows)
     ball = new_ball()
     spare_balls = [make_spare_ball(i) for i in range(SPARE_BALLS)]
     
@@ -147,6 +156,10 @@ def new_bricks():
     '''Returns a new set of bricks'''
     return [[make_brick([col + (0.5 if row % 2 == 1 else 0),row],random_color()) for col in range(GRID_WIDTH+(0 if row % 2 == 1 else 1))] for row in range(TOP_GAP,TOP_GAP+NUM_ROWS)]
 
+def index_bricks(brick_rows):
+    '''Returns a spatial hash of the bricks with one brick sized cell per grid position'''
+    return spatial_hash.SpatialHash(BRICK_SIZE, [brick for brick_row in brick_rows for brick in brick_row])
+
 def new_ball():
     '''Returns a new ball'''
     return sprite.Sprite(name='Ball',
@@ -178,7 +191,7 @@ def make_spare_ball(ball_number):
     
 def make_brick(grid_pos, color):
     '''Makes a brick'''
-    return sprite.Sprite(name=color,
+    return sprite.CompactSprite(name=color,
                          pos=grid_to_continuous(grid_pos),
                          size=BRICK_SIZE,
                          color=simplegui.COLOR_PALETTE[color],
@@ -187,7 +200,7 @@ def make_brick(grid_pos, color):
 
 def add_point_sprite(points, brick):
     '''Adds a point sprite to the world'''
-    point_sprites.append(sprite.Sprite(name=str(points),
+    point_sprites.append(sprite.CompactSprite(name=str(points),
                                        pos=brick.pos,
                                        vel=[0,2],
                                        size=brick.size,
@@ -212,45 +225,40 @@ def random_vel(speed,angle_range=[0,360]):
     ang = random.uniform(angle_range[0]*math.pi/180.,angle_range[1]*math.pi/180.)
     return [speed*math.cos(ang), speed*math.sin(ang)]
 
-def paddle_bounce(paddle, ball):
-    '''Bounces the ball off the paddle'''
-    if paddle and ball.overlaps(paddle):
-        gap = ball.gap_between(paddle)
-        x_bounce = -1 if gap[0] > gap[1] else 1
-        ball.vel = (x_bounce*ball.vel[0]+0.1*paddle.vel[0], -abs(ball.vel[1]))
-        return True
-    return False
-    
-def bricks_bounce(brick_rows, ball):
-    '''Bounces the ball of the bricks'''
-    
-    ball_grid_pos = continuous_to_grid(ball.pos)
-    row_guess = ball_grid_pos[1]-TOP_GAP
-    row_low  = min(max(row_guess-2,              0),len(brick_rows)-1)
-    row_high = max(min(row_guess+2,len(brick_rows)),1)
-    
-    remove_brick = None
-    for brick_row in brick_rows[row_low:row_high]:
-        for brick in brick_row:
-            if ball.overlaps(brick):
-                gap = ball.gap_between(brick)
-                rel_vel = ball.rel_velocity(brick)
-#                 if gap[0] < gap[1]:
-#                     ball.vel = (ball.vel[0], -ball.vel[1])
-#                 else:
-#                     ball.vel = (-ball.vel[0], ball.vel[1])
-                #ball.vel = [-v if sprite.check_bounce(g, r) else v for g, r, v in zip(gap, rel_vel, ball.vel)]
-                if gap[0] < gap[1]:
-                    ball.vel = (ball.vel[0], -ball.vel[1] if sprite.check_bounce(gap[1], rel_vel[1]) else ball.vel[1])
-                else:
-                    ball.vel = (-ball.vel[0] if sprite.check_bounce(gap[0], rel_vel[0]) else ball.vel[0], ball.vel[1])
-                
-                remove_brick = brick
-                break
-        if remove_brick:
-            brick_row.remove(remove_brick)
-            return remove_brick
-    return remove_brick
+def lose_ball():
+    '''Replaces the ball with a spare ball or ends the game'''
+    global ball, game_over, multiplier
+    if len(spare_balls) > 0:
+        spare_balls.pop()
+        ball = new_ball()
+        multiplier = 1
+    else:
+        game_over = True
+        ball = None
+
+def ball_bounce(target, pos, vel, normal):
+    '''Returns the ball velocity after hitting the target'''
+    if target is gutter:
+        return vel
+    elif target is paddle:
+        return paddle_bounce(paddle, vel, normal)
+    return collision.reflect(vel, normal)
+
+def paddle_bounce(paddle, vel, normal):
+    '''Bounces the ball off the paddle, always up and picking up some of the paddle's speed'''
+    x_bounce = -1 if vel[0]*normal[0] < 0 else 1
+    return (x_bounce*vel[0]+0.1*paddle.vel[0], -abs(vel[1]))
+
+def nearby_bricks(ball):
+    '''The bricks the ball could reach this tick, top to bottom, left to right'''
+    bricks = brick_index.query(*collision.swept_bounds(ball.pos, ball.size, ball.vel))
+    return sorted(bricks, key=lambda brick: (brick.pos[1], brick.pos[0]))
+
+def break_brick(brick):
+    '''Removes a hit brick and returns it'''
+    brick_index.remove(brick)
+    brick_rows[continuous_to_grid(brick.pos)[1]-TOP_GAP].remove(brick)
+    return brick
 
 def keep_score(paddle_hit, hit_brick):
     '''Keeps track of the score'''
@@ -284,19 +292,21 @@ def pause():
     global game_paused
     game_paused = not game_paused
     
-def setup():
+def setup(backend='window'):
     '''Setup the frame and event handlers'''
     global frame, images
     
     #build the frame
-    frame = simplegui.Frame('Breakout',(WIDTH,HEIGHT),canvas_color=BACKGROUND_COLOR)
+    frame = simplegui.Frame('Breakout',(WIDTH,HEIGHT),canvas_color=BACKGROUND_COLOR,backend=backend)
     frame.set_draw_handler(draw)
+    frame.set_update_handler(update)
     frame.set_key_down_handler(key_down)
     frame.set_key_up_handler(key_up)
+    simplegui.prewarm_fonts([30, 40])
     
     #configure images
     if IMAGES_ON:
-        images = dict([(key, simplegui.Image(image_info)) for key, image_info in image_infos.iteritems()])
+        images = assets.get_images(image_infos)
     else:
         images = dict([(key, None) for key, image_info in image_infos.iteritems()])
         
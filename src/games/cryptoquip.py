@@ -161,15 +161,17 @@ def mouse_click(pos):
     else:
         select_panel('key')
     
-def setup():
+def setup(backend='window'):
     '''Sets up a new cryptoquip game'''
     global frame
-    frame = simplegui.Frame('Cryptoquip', (WIDTH,HEIGHT),canvas_color=BACKGROUND_COLOR)
+    frame = simplegui.Frame('Cryptoquip', (WIDTH,HEIGHT),canvas_color=BACKGROUND_COLOR, backend=backend)
     
     frame.set_draw_handler(draw)
     frame.set_key_down_handler(key_down)
     frame.set_key_up_handler(key_up)
     frame.set_mouse_left_click_handler(mouse_click)
+    simplegui.prewarm_fonts([FONT_DIM[1]], 'serif')
+    simplegui.prewarm_fonts([2*FONT_DIM[1]])
     
     return frame
 
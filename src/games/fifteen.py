@@ -35,7 +35,7 @@ LETTER_COLOR = dict({0:'Ivory', 1:'FireBrick'})
 
 swapping_space = None
 swapping_count = 0.
-SWAP_STOP = 5.
+SWAP_STOP = 10.
 
 controls = dict([('left',(1,0)),('right',(-1,0)),('down',(0,-1)),('up',(0,1))])
 
@@ -166,12 +166,12 @@ def key_up(key):
     elif controls.has_key(key):
         control_move_tile(key)
 
-def setup():
+def setup(backend='window'):
     '''Setup the game'''
     global frame
     
     # create frame
-    frame = simplegui.Frame('Fifteen',(CANVAS_W, CANVAS_H),BUTTON_W)
+    frame = simplegui.Frame('Fifteen',(CANVAS_W, CANVAS_H),BUTTON_W,dirty_rects=True,backend=backend)
     
     # register event handlers
     frame.set_draw_handler(draw)
@@ -179,6 +179,7 @@ def setup():
     frame.add_button("Shuffle tiles", shuffle_button, BUTTON_W, BUTTON_FONT_H)
     frame.set_key_up_handler(key_up)
     frame.set_mouse_left_click_handler(click)
+    simplegui.prewarm_fonts([FONT_H, BUTTON_FONT_H])
     
     return frame
     
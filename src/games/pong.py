@@ -8,6 +8,7 @@ Created on Jun 8, 2014
 '''
 
 from game_tools import simplegui
+from game_tools import collision
 import random
 import math
 
@@ -43,6 +44,7 @@ SPEEDUP_FACTOR = 1.1
 mute_off = True
 
 paddles = []
+walls = collision.world_walls((WIDTH, HEIGHT), 'tb')
 
 class Paddle(object):
     '''Creates a paddle'''
@@ -51,6 +53,7 @@ class Paddle(object):
         '''Initialize the paddle'''
         self.name = name
         self.pos = pos
+        self.prev_pos = list(pos)
         self.size = size
         self.key_controls = {controls[0]:'up',controls[1]:'down'}
         self.control_states = {'up':False,'down':False}
@@ -102,26 +105,30 @@ class Paddle(object):
         else:
             return self.paddle_vel
         
-    def update(self):
-        '''Updates the paddle position'''
+    def steer(self):
+        '''Sets the paddle velocity for this step, before the ball moves'''
         if not game_paused:
             if self.human:
                 self.paddle_vel = self.get_vel()
             else:
                 self.paddle_vel = self.get_computer_move()
-            self.pos[1] += DT*self.paddle_vel
-            
-            #keep paddle on the table
-            if self.pos[1] < 0:
-                self.pos[1] = 0
-            elif self.pos[1] + self.size[1] > HEIGHT:
-                self.pos[1] = HEIGHT - self.size[1]
+    
+    def get_next_top(self):
+        '''Top of the paddle after this step, kept on the table'''
+        return min(max(self.pos[1] + DT*self.paddle_vel, 0), HEIGHT - self.size[1])
+        
+    def update(self):
+        '''Updates the paddle position'''
+        self.prev_pos = list(self.pos)
+        if not game_paused:
+            self.pos[1] = self.get_next_top()
                 
         
-    def draw(self, canvas):
-        '''Draws the paddle and the score'''
+    def draw(self, canvas, interpolation=0):
+        '''Draws the paddle, interpolation of the way from its last position, and the score'''
         # draw paddle
-        canvas.draw_rect(self.pos,self.size,1,"White","white")
+        pos = [p + interpolation*(p2 - p) for p, p2 in zip(self.prev_pos, self.pos)]
+        canvas.draw_rect(pos,self.size,1,"White","white")
         # draw score
         canvas.draw_text(str(self.score),self.score_pos,SCORE_FONT_H,"White")
         
@@ -150,10 +157,18 @@ class Paddle(object):
     
     def get_ball_to_paddle(self, ball_pos):
         '''Distance from the ball to the paddle in (x,y)'''
-        pad_center = (self.pos[0] + 0.5*self.size[0], self.pos[1] + 0.5*self.size[1])
+        pad_center = self.get_center()
         ball_to_paddle = (pad_center[0] - ball_pos[0], pad_center[1] - ball_pos[1])
         return ball_to_paddle
     
+    def get_rect(self):
+        '''Center position, size and velocity per step of the paddle, as it moves this step'''
+        return self.get_center(), self.size, (0, self.get_next_top() - self.pos[1])
+    
+    def get_center(self):
+        '''Center position of the paddle'''
+        return (self.pos[0] + 0.5*self.size[0], self.pos[1] + 0.5*self.size[1])
+    
     def increment_score(self):
         '''Increment the score'''
         self.score += 1
@@ -169,18 +184,34 @@ class Ball(object):
     def __init__(self, pos, radius, vel):
         '''Initializes the ball'''
         self.pos = pos
+        self.prev_pos = list(pos)
         self.radius = radius
         self.vel = vel
         
     def update(self):
-        '''Updates the ball's position'''
+        '''Moves the ball one step, bouncing off the walls and paddles it hits on the way'''
+        self.prev_pos = list(self.pos)
         if not game_paused:
-            self.pos[0] += DT * self.vel[0]
-            self.pos[1] += DT * self.vel[1]
+            pos = collision.sweep_path(self.pos, (DT*self.vel[0], DT*self.vel[1]), walls + paddles, self.sweep, collision_rect, self.hit)[0]
+            self.pos = list(pos)
+    
+    def sweep(self, pos, vel, target_pos, target_size, target_vel, max_time):
+        '''Finds when the ball hits a wall or paddle'''
+        return collision.sweep_circle(pos, self.radius, vel, target_pos, target_size, target_vel, max_time)
+    
+    def hit(self, target, pos, vel, normal):
+        '''Bounces off a wall or paddle, returns the rest of the step'''
+        if target in walls:
+            if mute_off: sound_plop.play()
+            self.bounce(VERTICAL)
+        elif abs(target.get_ball_to_paddle(pos)[1]) <= 0.5*target.size[1]:
+            self.bounce(HORIZONTAL, SPEEDUP_FACTOR)
+        return (DT*self.vel[0], DT*self.vel[1])
     
-    def draw(self, canvas):
-        '''Draws the ball on the canvas'''
-        canvas.draw_circle(self.pos,self.radius,1,"White","White")
+    def draw(self, canvas, interpolation=0):
+        '''Draws the ball on the canvas, interpolation of the way from its last position'''
+        pos = [p + interpolation*(p2 - p) for p, p2 in zip(self.prev_pos, self.pos)]
+        canvas.draw_circle(pos,self.radius,1,"White","White")
     
     def bounce(self,horizontal,speedup=1):
         '''Bounces the ball'''
@@ -191,19 +222,10 @@ class Ball(object):
             self.vel[0] *= speedup
             self.vel[1] *= -speedup
     
-    def collide_top_and_bottom(self):
-        """Bounces the ball off the ceiling and floor"""
-        if self.pos[1] - self.radius < 0 and self.vel[1] < 0:
-            #ceiling
-            if mute_off: sound_plop.play()
-            self.bounce(VERTICAL)
-        elif self.pos[1] + self.radius > HEIGHT and self.vel[1] > 0:
-            #floor
-            if mute_off: sound_plop.play()
-            self.bounce(VERTICAL)
-            
+def collision_rect(target):
+    '''Center position, size and velocity per step of a wall or paddle'''
+    return target.get_rect() if isinstance(target, Paddle) else collision.sprite_rect(target)
             
-    
 # helper functions
 # ball functions
 # initialize ball_pos and ball_vel for new bal in middle of table
@@ -261,25 +283,32 @@ def new_game():
         
     game_paused = False
 
+def update():
+    """ Move and collide the ball and paddles, one DT step. """
+    # steer the paddles first, so the ball is swept against where they move
+    for paddle in paddles:
+        paddle.steer()
+        
+    # update, collide the ball
+    ball.update()
+
+    #update paddles
+    for paddle in paddles:
+        paddle.collide()
+        paddle.update()
+
 def draw(c):
     """ Draw the board, ball, paddles, and score. """
-    global ball_pos, ball_vel
-    
     # draw mid line and gutters
     c.draw_line([int(WIDTH / 2), 0],[int(WIDTH / 2), HEIGHT], 1, "White")
     c.draw_line([PAD_WIDTH, 0],[PAD_WIDTH, HEIGHT], 1, "White")
     c.draw_line([WIDTH - PAD_WIDTH, 0],[WIDTH - PAD_WIDTH, HEIGHT], 1, "White")
         
-    # update, draw, collide the ball
-    ball.update()
-    ball.draw(c)
-    ball.collide_top_and_bottom()
-
-    #update and draw paddles
+    # draw the ball and paddles between the last two updates
+    interpolation = 1 if game_paused else frame.interpolation
+    ball.draw(c, interpolation)
     for paddle in paddles:
-        paddle.collide()
-        paddle.update()
-        paddle.draw(c)
+        paddle.draw(c, interpolation)
     
         
 def keydown(key):
@@ -334,17 +363,19 @@ def mute():
     global mute_off
     mute_off = not mute_off
 
-def setup():
+def setup(backend='window'):
     '''Setup the frame and buttons'''
     global frame, plyr1_button, plyr2_button, difficulty_button
     global sound_beeep, sound_peeeeeep, sound_plop
     # create frame
-    frame = simplegui.Frame("Pong", (WIDTH, HEIGHT), BUTTON_W)
+    frame = simplegui.Frame("Pong", (WIDTH, HEIGHT), BUTTON_W, backend=backend)
     
     # register event handlers
     frame.set_draw_handler(draw)
+    frame.set_update_handler(update, int(1/DT))
     frame.set_key_down_handler(keydown)
     frame.set_key_up_handler(keyup)
+    simplegui.prewarm_fonts([BUTTON_FONT_H, SCORE_FONT_H])
     
     frame.add_label(" ")
     frame.add_button("Restart",new_game, 0.9*BUTTON_W, BUTTON_FONT_H)
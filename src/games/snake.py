@@ -9,7 +9,9 @@ Created on Jun 11, 2014
 '''
 
 from game_tools import simplegui
+from game_tools import assets
 from game_tools import sprite
+import collections
 import random
 
 #SCREEN_SHOT_FILE = None
@@ -70,50 +72,64 @@ class Snake(object):
             self.images = images
         self.head = sprite.Sprite('head', start_pos, vel, 0, (unit_size,unit_size), color, draw_method=draw_head, image=self.images['head'], update_method=sprite.update_toroid)
         self.neck = sprite.Sprite('neck', start_pos, vel, self.head.rot, (unit_size,unit_size), color, image=self.images['neck'])
-        self.body = []
+        # body segments from the tail end to the neck, as (pos, rot, image key)
+        self.body = collections.deque()
+        self.segment = sprite.CompactSprite('seg', start_pos, [0,0], 0, (unit_size,unit_size), color, image=self.images['straight'])
         self.tail = None
         self.size = (unit_size,unit_size)
         self.color = color
         self.controls = dict([('left',1),('right',-1)])
         
+        # occupied cells with the number of snake parts on them, and the free cells for placing food
+        self.cell_counts = dict([])
+        self.free_cells = [(col, row) for row in range(HEIGHT/UNIT) for col in range(WIDTH/UNIT)]
+        self.free_index = dict([(cell, i) for i, cell in enumerate(self.free_cells)])
+        self.occupy(pos_to_cell(self.head.pos))
+        
     
     def update(self):
         '''Update the snakes position, try to eat food, and grow'''
-        new_seg = sprite.Sprite('seg',self.head.pos,[0,0],self.head.rot,self.size,self.color,image=self.images['straight'])
+        new_seg_pos, new_seg_rot, new_seg_key = self.head.pos, self.head.rot, 'straight'
         
         self.head.update((WIDTH,HEIGHT))
+        self.occupy(pos_to_cell(self.head.pos))
         if self.neck.rot != self.head.rot:
             if (self.head.rot - self.neck.rot) % 4 == 1:
-                new_seg.image = self.images['left']
+                new_seg_key = 'left'
             else:
-                new_seg.image = self.images['right']
+                new_seg_key = 'right'
             self.neck.rot = self.head.rot
         self.neck.pos = self.head.pos
-        if self.eat_food():
-            self.body.append(new_seg)
-        else:
-            self.body.append(new_seg)
-            old_seg = self.body.pop(0)
+        self.body.append((new_seg_pos, new_seg_rot, new_seg_key))
+        if not self.eat_food():
+            old_seg_pos, old_seg_rot, old_seg_key = self.body.popleft()
             if self.tail:
-                self.tail.pos = old_seg.pos
-                self.tail.rot = old_seg.rot
+                self.vacate(pos_to_cell(self.tail.pos))
+                self.tail.pos = old_seg_pos
+                self.tail.rot = old_seg_rot
+            else:
+                self.vacate(pos_to_cell(old_seg_pos))
         
         if self.tail is None and len(self.body) > 0:
-            self.tail = self.body.pop(0)
-            self.tail.name = 'tail'
-            self.tail.draw_method = draw_tail
-            #self.tail.image = None
-            self.tail.image = self.images['tail']
+            tail_pos, tail_rot, tail_key = self.body.popleft()
+            self.tail = sprite.CompactSprite('tail', tail_pos, [0,0], tail_rot, self.size, self.color, image=self.images['tail'], draw_method=draw_tail)
         
     def draw(self, canvas):
-        '''Draws the snake on the canvas'''
+        '''Draws the snake on the canvas, blitting the images as one batch'''
+        sprite.draw_sprites(canvas, self.parts())
+    
+    def parts(self):
+        '''Yields the parts of the snake from tail to head, moving one segment sprite along the body'''
         if self.tail:
-            self.tail.draw(canvas)
-            self.neck.draw(canvas)
-        for segment in self.body:
-            segment.draw(canvas)
-        
-        self.head.draw(canvas)
+            yield self.tail
+            yield self.neck
+        segment = self.segment
+        for pos, rot, image_key in self.body:
+            segment.pos = pos
+            segment.rot = rot
+            segment.image = self.images[image_key]
+            yield segment
+        yield self.head
             
     def eat_food(self):
         '''Eats the food if the head finds it'''
@@ -138,34 +154,47 @@ class Snake(object):
         if self.controls.has_key(key):
             self.turn(self.controls[key])
         
+    def occupy(self, cell):
+        '''Marks a cell as having one more snake part on it'''
+        count = self.cell_counts.get(cell, 0)
+        if count == 0:
+            # swap the last free cell into this one's place
+            index = self.free_index.pop(cell)
+            last = self.free_cells.pop()
+            if last != cell:
+                self.free_cells[index] = last
+                self.free_index[last] = index
+        self.cell_counts[cell] = count + 1
+    
+    def vacate(self, cell):
+        '''Marks a cell as having one less snake part on it'''
+        count = self.cell_counts.pop(cell) - 1
+        if count > 0:
+            self.cell_counts[cell] = count
+        else:
+            self.free_index[cell] = len(self.free_cells)
+            self.free_cells.append(cell)
+    
     def check_collision(self):
         '''Check for collisions with the snake body'''
-        if any([seg.pos == self.head.pos for seg in self.body]):          
-            return True
-        elif self.tail and self.tail.pos == self.head.pos:
-            return True
-        else:
-            return False
+        return self.cell_counts[pos_to_cell(self.head.pos)] > 1
     
     def is_on(self, other_sprite):
-        '''Checks to see if the any part of the snake is on the position'''
-#         if self.head.pos == pos:
-#             return True
-#         if self.tail and self.tail.pos == pos:
-#             return True
-#         return any([seg.pos==pos for seg in self.body])
-        if self.head.overlaps(other_sprite):
-            return True
-        if self.tail and self.tail.overlaps(other_sprite):
-            return True
-        return any(seg.overlaps(other_sprite) for seg in self.body)
+        '''Checks to see if the any part of the snake is on the sprite's cell'''
+        return self.cell_counts.has_key(pos_to_cell(other_sprite.pos))
+    
+    def random_free_cell(self):
+        '''Returns a random cell without any of the snake on it, or None if there are none'''
+        if self.free_cells:
+            return random.choice(self.free_cells)
+        return None
     
 def new_food():
-    '''Put new food down'''
-    food_pos = rand_pos()
-    while snake.is_on(sprite.Sprite(pos=food_pos,size=[UNIT,UNIT])):
-        food_pos = rand_pos()
-    return sprite.Sprite('food',food_pos,[0,0],0,[UNIT,UNIT],FOOD_COLOR,line_color=FOOD_COLOR,draw_method=sprite.draw_circle,image=images['food'])
+    '''Put new food down on a free cell, or no food if the snake fills the board'''
+    cell = snake.random_free_cell()
+    if cell is None:
+        return None
+    return sprite.Sprite('food',cell_to_pos(cell),[0,0],0,[UNIT,UNIT],FOOD_COLOR,line_color=FOOD_COLOR,draw_method=sprite.draw_circle,image=images['food'])
 
 def new_game():
     '''Create a new game'''
@@ -177,6 +206,14 @@ def rand_pos():
     '''Creates a random position on the board'''
     return [random.randrange(WIDTH/UNIT)*UNIT + 0.5*UNIT,random.randrange(HEIGHT/UNIT)*UNIT + 0.5*UNIT]
 
+def pos_to_cell(pos):
+    '''Translates a position to the (col, row) of the board cell it is in'''
+    return (int(pos[0]//UNIT), int(pos[1]//UNIT))
+
+def cell_to_pos(cell):
+    '''Translates a board cell to the position of its center'''
+    return [cell[0]*UNIT + 0.5*UNIT, cell[1]*UNIT + 0.5*UNIT]
+
 def key_down(key):
     '''Key down Handler'''
     if snake:
@@ -199,14 +236,11 @@ def mouse_click(pos):
     if game_paused:
         game_paused = False
 
-def draw(canvas):
-    '''Draw the board and pieces'''
+def update():
+    '''Move the snake and put down food'''
     global food, move_count, game_over
     if food is None:
         food = new_food()
-    
-    food.draw(canvas)
-    snake.draw(canvas)
         
     if not game_over:
         move_count = (move_count + 1) % MOVE_COUNT
@@ -214,30 +248,38 @@ def draw(canvas):
             snake.update()
             if snake.check_collision():
                 game_over = True
-                
-    else:
+
+def draw(canvas):
+    '''Draw the board and pieces'''
+    if food:
+        food.draw(canvas)
+    snake.draw(canvas)
+    
+    if game_over:
         canvas.draw_rect([0.2*WIDTH,0.5*HEIGHT-UNIT],[0.6*WIDTH,2*UNIT],0,(128,128,128),(128,128,128))
         canvas.draw_text('GAME OVER',[WIDTH/2,HEIGHT/2],40,'White',align=('center','middle'))
         
     if AUTO_SCREEN_SHOT and move_count == 0 and not game_paused and not game_over:
         frame.screen_shot()
 
-def setup():
+def setup(backend='window'):
     '''Setup the frame and controls'''
     global frame, images
     
-    frame = simplegui.Frame('Snake',(WIDTH,HEIGHT))
+    frame = simplegui.Frame('Snake',(WIDTH,HEIGHT),backend=backend)
     
     frame.set_background_color(BACKGROUND_COLOR)
     frame.set_draw_handler(draw)
+    frame.set_update_handler(update)
     
     frame.set_key_down_handler(key_down)
     frame.set_key_up_handler(key_up)
     frame.set_mouse_left_click_handler(mouse_click)
+    simplegui.prewarm_fonts([40])
     
     #configure images
     if IMAGES_ON:
-        images = dict([(key, simplegui.Image(image_info)) for key, image_info in image_infos.iteritems()])
+        images = assets.get_images(image_infos)
     else:
         images = dict([(key, None) for key, image_info in image_infos.iteritems()])
         
@@ -6,6 +6,7 @@ Created on Jun 9, 2014
 @author: Robb
 '''
 from game_tools import simplegui
+from game_tools import assets
 from game_tools import sprite
 import random
 
@@ -21,10 +22,13 @@ IMAGES_ON = False
 game_over = False
 game_paused = False
 cnt = 0
-DROP = 20
+DROP = 40
+CONTROL_TICK = 4
 
 #blocks = []
 block_rows = []
+settled_layer = None
+board = None
 
 current_tetroid = None
 score = 0
@@ -41,6 +45,9 @@ TETROID_OFFSET_DICT = dict([('square',  (( 0,0),(0,1),(1,0),(1,1))),
                            ('L2',       ((-1,-1),(-1,0),(0,0),(1,0))),
                            ('line',     ((-1,0),(0,0),(1,0),(2,0)))])
 
+# the offsets for all four rotations of each tetroid, in board cells
+TETROID_ROTATION_DICT = dict([(key, sprite.rotation_table(offsets)) for key, offsets in TETROID_OFFSET_DICT.iteritems()])
+
 TETROID_COLOR_DICT = dict([('square','FireBrick'),
                            ('zig-zag 1','SteelBlue'),
                            ('zig-zag 2','Plum'),
@@ -96,6 +103,10 @@ class Tetroid(sprite.Sprite):
         '''Initializes the tetroid'''
         self.blocks = []
         self.offsets = offsets
+        if name in TETROID_ROTATION_DICT:
+            self.rotations = TETROID_ROTATION_DICT[name]
+        else:
+            self.rotations = sprite.rotation_table(offsets)
         self.unit = unit
         self.block_image = image
         
@@ -136,64 +147,137 @@ class Tetroid(sprite.Sprite):
             block.draw(canvas)
     
     def update_blocks(self):
-        '''Updates the position of the blocks'''
-        for block, offset in zip(self.blocks, self.offsets):
-            block.pos = self.rotate_offset([offset[0]*self.unit, offset[1]*self.unit])
+        '''Updates the position of the blocks from the precomputed rotated offsets'''
+        if self.blocks:
+            x, y = self.pos
+            for block, offset in zip(self.blocks, self.rotations[self.rot]):
+                block.pos = (x + offset[0]*self.unit, y + offset[1]*self.unit)
             
     def rotate(self, direction):
         '''Rotates the tetroid +1 for clockwise, -1 for counterclockwise'''
         super(Tetroid, self).rotate(direction)
         
-        if any([block.pos[0] < 0 or block.pos[0] >= WIDTH or \
-                block.pos[1] >= HEIGHT for block in self.blocks]) or \
+        if any(block.pos[0] < 0 or block.pos[0] >= WIDTH or \
+               block.pos[1] >= HEIGHT for block in self.blocks) or \
            not no_overlaps_w_blocks(self.blocks,[0,0]):
             super(Tetroid, self).rotate(-direction)
         
     def move_left(self):
         '''Moves the tetroid one unit to the left'''
-        if all([block.get_left_edge() > 0 for block in self.blocks]) and \
+        if all(block.get_left_edge() > 0 for block in self.blocks) and \
             no_overlaps_w_blocks(self.blocks,[-self.unit,0]):
             self.move([-self.unit, 0])
             
     def move_right(self):
         '''Moves the tetroid one unit to the right'''
-        if all([block.get_right_edge() < WIDTH for block in self.blocks]) and \
+        if all(block.get_right_edge() < WIDTH for block in self.blocks) and \
             no_overlaps_w_blocks(self.blocks,[self.unit,0]):
             self.move([self.unit, 0])
             
     def move_down(self):
         '''Moves the tetroid one unit down'''
-        if all([block.get_bottom_edge() < HEIGHT for block in self.blocks]) and \
+        if all(block.get_bottom_edge() < HEIGHT for block in self.blocks) and \
             no_overlaps_w_blocks(self.blocks,[0,self.unit]):
             self.move([0, self.unit])
             
+    def grid_cells(self, move=(0,0)):
+        '''The (col, row) board cells the blocks cover after a movement'''
+        return [pos_to_cell((block.pos[0] + move[0], block.pos[1] + move[1])) for block in self.blocks]
+            
+class Board(object):
+    '''
+    Occupancy grid of the laid down blocks, one byte per cell stored row
+    by row, so collisions, completed rows and clears are array operations.
+    '''
+    
+    def __init__(self, cols, rows, cells=None):
+        '''Initializes an empty board or a copy of the cells'''
+        self.cols = cols
+        self.rows = rows
+        self.cells = bytearray(cols*rows) if cells is None else bytearray(cells)
+        self.empty_row = bytearray(cols)
+        
+    def occupied(self, col, row):
+        '''Checks if a cell is taken, the sides and floor count as taken and above the top is free'''
+        if col < 0 or col >= self.cols or row >= self.rows:
+            return True
+        return row >= 0 and self.cells[row*self.cols + col] != 0
+    
+    def fits(self, cells):
+        '''Checks that none of the (col, row) cells are taken'''
+        for col, row in cells:
+            if self.occupied(col, row):
+                return False
+        return True
+    
+    def fits_mask(self, mask, col, row):
+        '''Checks if a piece mask, like TETROID_ROTATION_DICT[name][rot], fits with its origin at col, row'''
+        return self.fits([(col + d_col, row + d_row) for d_col, d_row in mask])
+    
+    def landing_row(self, mask, col, row=0):
+        '''The lowest row a piece mask falls to from row, or None if it doesn't fit there'''
+        if not self.fits_mask(mask, col, row):
+            return None
+        while self.fits_mask(mask, col, row + 1):
+            row += 1
+        return row
+    
+    def place(self, cells, value=1):
+        '''Fills in the (col, row) cells that are on the board'''
+        for col, row in cells:
+            if 0 <= row < self.rows:
+                self.cells[row*self.cols + col] = value
+                
+    def completed_rows(self):
+        '''Return the completed row numbers'''
+        return [row for row in range(self.rows)
+                if self.cells.find(b'\x00', row*self.cols, (row + 1)*self.cols) == -1]
+    
+    def clear_rows(self, rows_to_clear):
+        '''Removes the rows, in increasing order, shifting the rows above down'''
+        for row in rows_to_clear:
+            del self.cells[row*self.cols:(row + 1)*self.cols]
+            self.cells[0:0] = self.empty_row
+            
+    def copy(self):
+        '''A copy of the board for trying out placements'''
+        return Board(self.cols, self.rows, self.cells)
+    
+    def __repr__(self):
+        '''Returns the board as rows of . and #'''
+        return '\n'.join(''.join('#' if c else '.' for c in self.cells[row*self.cols:(row + 1)*self.cols]) for row in range(self.rows))
+        
+def pos_to_cell(pos):
+    '''Translates a block's center position to its (col, row) board cell'''
+    return (int(pos[0] // BLOCK_H), int(pos[1] // BLOCK_H))
         
 def no_overlaps_w_blocks(tetroid_blocks, move):
     '''Checks to see if the blocks movement will overlap a laid down block'''
-    for block in tetroid_blocks:
-        new_pos = (block.pos[0] + move[0], block.pos[1] + move[1])
-        for check_block in block_rows[int(new_pos[1]/block.size[1])]:
-            if check_block.pos == new_pos:
-                return False
-    return True
+    return board.fits([pos_to_cell((block.pos[0] + move[0], block.pos[1] + move[1])) for block in tetroid_blocks])
 
 def drop_blocks(tetroid):
     '''Drops the blocks from the tetroid onto the board'''
+    board.place(tetroid.grid_cells())
     for block in tetroid.blocks:
         block_rows[int(block.pos[1]/block.size[1])].append(block)
+        settled_layer.invalidate(block.get_bounds())
 
 def completed_rows():
     '''Return the completed row numbers'''
-    return [i for i, row in enumerate(block_rows) if len(row) == WIDTH/BLOCK_H]
+    return board.completed_rows()
 
 def remove_completed_rows(rows_to_remove):
     '''Removes any rows that are completed'''
+    board.clear_rows(rows_to_remove)
     for i in rows_to_remove:
         for row in block_rows[:i]:
             for block in row:
                 block.pos = [block.pos[0], block.pos[1]+BLOCK_H]
         block_rows.pop(i)
         block_rows.insert(0,[])
+    if rows_to_remove:
+        # the rows above the lowest cleared row all move down
+        settled_layer.invalidate((0, 0, WIDTH, (max(rows_to_remove)+1)*BLOCK_H))
 
 def increase_score(num_rows):
     '''Increase the score'''
@@ -210,17 +294,17 @@ def increase_score(num_rows):
         high_score_label.text = 'High Score: '+str(high_score)
     
         
-def draw(canvas):
-    '''Draw the board'''
+def update():
+    '''Move and drop the tetroid and clear completed rows'''
     global cnt, game_over, current_tetroid, flashing_rows, flashes
     
     if not game_paused and not game_over:
-        speed = DROP - (lines / 10)
-        if speed < 1:
-            speed = 1
+        speed = DROP - 2*(lines / 10)
+        if speed < 2:
+            speed = 2
         cnt = (cnt + 1) % speed
         
-        if cnt % 2 == 0:
+        if cnt % CONTROL_TICK == 0:
             for control, state in control_state.iteritems():
                 if state:
                     if control == 'left':
@@ -242,8 +326,6 @@ def draw(canvas):
                  
                 if not no_overlaps_w_blocks(current_tetroid.blocks,[0,0]):
                     game_over = True
-                    
-        current_tetroid.draw(canvas)
     
     if flashes == 0:
         remove_completed_rows(flashing_rows)
@@ -253,17 +335,23 @@ def draw(canvas):
     rows = completed_rows()
     if any(r not in flashing_rows for r in rows):
         flashing_rows = rows
-        flashes = 4*len(flashing_rows)
-    
-    
-    for row in block_rows:
-        for block in row:
-            block.draw(canvas)
-    
-    if (flashes / 2) % 2 == 0:
+        flashes = 8*len(flashing_rows)
+    flashes -= 1
+        
+def draw(canvas):
+    '''Draw the board, over the settled blocks drawn by draw_settled'''
+    if current_tetroid:
+        if game_over:
+            # the piece that could not enter stays under the settled blocks it overlaps
+            for block in current_tetroid.blocks:
+                if not board.occupied(*pos_to_cell(block.pos)):
+                    block.draw(canvas)
+        else:
+            current_tetroid.draw(canvas)
+    
+    if ((flashes + 2) / 4) % 2 == 0:
         for i in flashing_rows:
             canvas.draw_rect([0,i*BLOCK_H],[WIDTH,BLOCK_H],0,'White','White')
-    flashes -= 1
     if game_over:
         canvas.draw_rect([0.1*WIDTH,0.5*HEIGHT-BLOCK_H],[0.8*WIDTH,2*BLOCK_H],0,'Grey','Grey')
         canvas.draw_text('GAME OVER',[WIDTH/2,HEIGHT/2],40,'White',align=('center','middle'))
@@ -271,6 +359,13 @@ def draw(canvas):
     if AUTO_SCREEN_SHOT and cnt == 0 and not game_paused and not game_over:
         frame.screen_shot()
     
+def draw_settled(layer):
+    '''Draws the settled blocks into the static layer, only the rows being redrawn'''
+    clip = layer.get_clip()
+    for row in block_rows[max(clip.top//BLOCK_H - 1, 0):clip.bottom//BLOCK_H + 1]:
+        for block in row:
+            block.draw(layer)
+    
 def new_tetroid():
     '''Creates a new random Tetroid'''
     key = random.choice(TETROID_OFFSET_DICT.keys())
@@ -288,9 +383,11 @@ def next_tetroid():
     
 def new_game():
     '''Clears the board and starts a new game'''
-    global block_rows, game_over, game_paused, current_tetroid, flashing_rows, flashes, score, lines
+    global block_rows, board, game_over, game_paused, current_tetroid, flashing_rows, flashes, score, lines
     
     block_rows = [[] for _ in range(int(HEIGHT/BLOCK_H))]
+    board = Board(int(WIDTH/BLOCK_H), int(HEIGHT/BLOCK_H))
+    settled_layer.invalidate()
     flashing_rows = []
     flashes = 0
     
@@ -330,16 +427,19 @@ def pause():
     global game_paused
     game_paused = not game_paused
     
-def setup():
+def setup(backend='window'):
     '''Setup the frame and event handlers'''
-    global frame, next_container, score_label, lines_label, high_score_label, images
-    frame = simplegui.Frame('Tetris',(WIDTH,HEIGHT),160)
+    global frame, next_container, score_label, lines_label, high_score_label, images, settled_layer
+    frame = simplegui.Frame('Tetris',(WIDTH,HEIGHT),160,dirty_rects=True,backend=backend)
     frame.set_draw_handler(draw)
+    settled_layer = frame.set_static_layer(draw_settled)
+    frame.set_update_handler(update)
     frame.set_key_down_handler(key_down)
     frame.set_key_up_handler(key_up)
+    simplegui.prewarm_fonts([frame.control_panel.default_font_h, 40])
     
     if IMAGES_ON:
-        images = dict([(key, simplegui.Image(image_info)) for key, image_info in image_infos.iteritems()])
+        images = assets.get_images(image_infos)
     else:
         images = dict([(key, None) for key, image_info in image_infos.iteritems()])
     
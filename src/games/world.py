@@ -7,31 +7,370 @@ Created on Jun 23, 2014
 @author: Robb
 '''
 
+import os
+import threading
+
+from game_tools import simplegui
+from game_tools import sprite
+from games import world_file
+
+CELL_SIZE = 30
+CHUNK_CELLS = 16
 
 class World(object):
-    '''The world for a game'''
-    
-    def __init__(self, size=(400,400), background_color='Black', blocks=[]):
+    '''
+    The world for a game, which can be much bigger than the window. Blocks
+    sit on a grid of cells and are kept in chunks of CHUNK_CELLS by
+    CHUNK_CELLS cells, in a dictionary keyed by chunk, so finding the block on
+    a cell doesn't depend on how many blocks there are.
+
+    The part of the world under the camera is drawn into a static layer under
+    the canvas, which is only redrawn where blocks are added or removed or
+    when the camera moves, and then only from the chunks in view.
+
+    Worlds opened from a file rebuild the blocks of each chunk when the chunk
+    is first used. The file can be replaced by a snapshot saved on another
+    thread, so it is only read with the reader lock held.
+    '''
+
+    def __init__(self, size=(400,400), background_color='Black', blocks=None, cell_size=CELL_SIZE, chunk_cells=CHUNK_CELLS):
         '''Constructs a world'''
         self.size = size
         self.background_color = background_color
-        self.blocks = blocks
-        
+        self.cell_size = cell_size
+        self.chunk_cells = chunk_cells
+        self.chunks = dict([])
+        self.block_count = 0
+        self.camera = (0, 0)
+        self.view_size = None
+        self.layer = None
+        self.drawn_background_color = None
+        self.reader = None
+        self.reader_lock = threading.Lock()
+        self.unloaded_chunks = set()
+        self.source_file = None
+        if blocks:
+            for block in blocks:
+                self.add_block(block)
+
+    @classmethod
+    def load(cls, file_name):
+        '''Opens a world saved with save, leaving the blocks in the file until their chunks are used'''
+        reader = world_file.WorldReader(file_name)
+        world = cls(reader.size, reader.background_color, cell_size=reader.cell_size, chunk_cells=reader.chunk_cells)
+        world.reader = reader
+        world.unloaded_chunks = set(reader.chunks)
+        world.block_count = reader.block_count
+        return world
+
+    def save(self, file_name):
+        '''Saves the world to a world file, copying the chunks that haven't been loaded from the file it was opened from'''
+        temp_file = file_name + '.tmp'
+        with self.reader_lock:
+            world_file.write_world_file(self, temp_file, self.reader)
+        self.replace_file(temp_file, file_name)
+
+    def load_chunk(self, key):
+        '''Rebuilds the blocks of a chunk from the world file'''
+        with self.reader_lock:
+            blocks = self.reader.read_chunk(key)
+        self.build_chunk(key, blocks)
+        if not self.unloaded_chunks:
+            self.close_file()
+
+    def load_all(self):
+        '''Rebuilds the blocks of all the chunks still in the world file'''
+        if self.reader:
+            with self.reader_lock:
+                chunks = list(self.reader.iter_chunks(self.unloaded_chunks))
+            for key, blocks in chunks:
+                self.build_chunk(key, blocks)
+            self.close_file()
+
+    def build_chunk(self, key, blocks):
+        '''Makes the blocks of a chunk from their cells and palette entries'''
+        self.unloaded_chunks.discard(key)
+        cell_center = self.cell_center
+        self.chunks[key] = dict([(cell, world_file.make_block(entry, cell_center(cell))) for cell, entry in blocks])
+
+    def close_file(self):
+        '''Closes the world file once all the chunks are loaded'''
+        with self.reader_lock:
+            self.reader.close()
+            self.reader = None
+
+    def copy(self):
+        '''
+        Copies the world, sharing its blocks, so it can be saved while the
+        world changes. Chunks that haven't been loaded aren't read, the copy
+        keeps their keys and the source_file to stream them from when saving.
+        '''
+        the_copy = World(self.size, self.background_color, cell_size=self.cell_size, chunk_cells=self.chunk_cells)
+        the_copy.chunks = dict([(key, dict(chunk)) for key, chunk in self.chunks.iteritems()])
+        the_copy.block_count = self.block_count
+        if self.unloaded_chunks:
+            the_copy.unloaded_chunks = set(self.unloaded_chunks)
+            the_copy.source_file = self.reader.file_name
+        return the_copy
+
+    def replace_file(self, temp_file, file_name):
+        '''
+        Replaces a world file with a snapshot of this world written to the
+        temporary file, switching to reading unloaded chunks from the snapshot
+        if the world was opened from the file
+        '''
+        with self.reader_lock:
+            reopen = self.reader is not None and os.path.abspath(self.reader.file_name) == os.path.abspath(file_name)
+            if reopen:
+                # a file can't be replaced while it is mapped on some systems
+                self.reader.close()
+                self.reader = None
+            try:
+                world_file.replace_file(temp_file, file_name)
+            finally:
+                if reopen:
+                    self.reader = world_file.WorldReader(file_name)
+
+    def get_chunk(self, key):
+        '''Gets the chunk's dictionary of blocks by cell, loading it if needed, or None if it is empty'''
+        if key in self.unloaded_chunks:
+            self.load_chunk(key)
+        return self.chunks.get(key)
+
+    def get_blocks(self):
+        '''Gets a list of all the blocks, chunk by chunk'''
+        self.load_all()
+        return [block for chunk in self.chunks.itervalues() for block in chunk.itervalues()]
+
+    blocks = property(get_blocks)
+
+    def cell_of(self, pos):
+        '''The (col, row) of the cell a world position is in'''
+        return (int(pos[0]//self.cell_size), int(pos[1]//self.cell_size))
+
+    def cell_center(self, cell):
+        '''The world position of the center of a cell'''
+        return (cell[0]*self.cell_size + 0.5*self.cell_size, cell[1]*self.cell_size + 0.5*self.cell_size)
+
+    def has_cell(self, cell):
+        '''Checks if the cell is inside the world'''
+        cols, rows = self.cell_of(self.size)
+        return 0 <= cell[0] < cols and 0 <= cell[1] < rows
+
+    def chunk_of(self, cell):
+        '''The key of the chunk a cell is in'''
+        return (cell[0]//self.chunk_cells, cell[1]//self.chunk_cells)
+
+    def get_block(self, cell):
+        '''Gets the block on the cell, or None'''
+        chunk = self.get_chunk(self.chunk_of(cell))
+        if chunk is None:
+            return None
+        return chunk.get(cell)
+
+    def block_at(self, pos):
+        '''Gets the block on the cell under the world position, or None'''
+        return self.get_block(self.cell_of(pos))
+
+    def add_block(self, block):
+        '''Adds a block on the cell under its position, returning the block it replaced or None'''
+        return self.set_cells([(self.cell_of(block.pos), block)])[0]
+
+    def remove_block(self, block):
+        '''Removes a block from the world'''
+        if self.get_block(self.cell_of(block.pos)) is not block:
+            raise ValueError('{0!r} is not in the world'.format(block))
+        self.remove_cell(self.cell_of(block.pos))
+
+    def remove_cell(self, cell):
+        '''Removes the block on the cell, returning it or None if the cell is empty'''
+        return self.set_cells([(cell, None)])[0]
+
+    def set_cells(self, changes):
+        '''
+        Puts each (cell, block) change's block on its cell, or empties the cell
+        if the block is None, in one pass. The area covered by the old and new
+        blocks is redrawn once. Changes of cells outside the world are skipped.
+        Returns the old block, or None, for each change.
+        '''
+        old_blocks = []
+        left = top = right = bottom = None
+        for cell, block in changes:
+            if not self.has_cell(cell):
+                old_blocks.append(None)
+                continue
+            key = self.chunk_of(cell)
+            chunk = self.get_chunk(key)
+            old_block = chunk.get(cell) if chunk else None
+            old_blocks.append(old_block)
+            if block is None:
+                if old_block is None:
+                    continue
+                del chunk[cell]
+                if not chunk:
+                    del self.chunks[key]
+                self.block_count -= 1
+            else:
+                if chunk is None:
+                    chunk = self.chunks[key] = dict([])
+                chunk[cell] = block
+                if old_block is None:
+                    self.block_count += 1
+            for changed in (old_block, block):
+                if changed is not None:
+                    x, y, width, height = changed.get_bounds()
+                    if left is None:
+                        left, top, right, bottom = x, y, x + width, y + height
+                    else:
+                        left, top, right, bottom = min(left, x), min(top, y), max(right, x + width), max(bottom, y + height)
+        if left is not None:
+            self.invalidate_region((left, top, right - left, bottom - top))
+        return old_blocks
+
+    def kind_at(self, cell):
+        '''The palette entry of the block on the cell, or None if it is empty'''
+        block = self.get_block(cell)
+        return world_file.palette_entry(block) if block else None
+
+    def flood_cells(self, cell):
+        '''
+        The cells connected to the cell, across their sides, that have the same
+        kind of block or are empty like it, within the world
+        '''
+        if not self.has_cell(cell):
+            return []
+        kind = self.kind_at(cell)
+        found = set([cell])
+        to_check = [cell]
+        while to_check:
+            col, row = to_check.pop()
+            for neighbor in ((col-1, row), (col+1, row), (col, row-1), (col, row+1)):
+                if neighbor not in found and self.has_cell(neighbor) and self.kind_at(neighbor) == kind:
+                    found.add(neighbor)
+                    to_check.append(neighbor)
+        return list(found)
+
+    def copy_region(self, first, last):
+        '''
+        Copies the kinds of the blocks in the rectangle of cells between two
+        corners, as (offset from the top left cell, palette entry or None)
+        '''
+        left, top = min(first[0], last[0]), min(first[1], last[1])
+        return [((col - left, row - top), self.kind_at((col, row))) for col, row in rect_cells(first, last)]
+
+    def chunks_in(self, rect):
+        '''Yields the chunks overlapping a (left, top, width, height) world region'''
+        left, top, width, height = rect
+        first_col, first_row = self.chunk_of(self.cell_of((left, top)))
+        last_col, last_row = self.chunk_of(self.cell_of((left + width - 1, top + height - 1)))
+        for row in range(first_row, last_row + 1):
+            for col in range(first_col, last_col + 1):
+                chunk = self.get_chunk((col, row))
+                if chunk:
+                    yield chunk
+
+    def blocks_in(self, rect):
+        '''Yields the blocks in the chunks overlapping a world region'''
+        for chunk in self.chunks_in(rect):
+            for block in chunk.itervalues():
+                yield block
+
+    def set_camera(self, pos):
+        '''Moves the top left of the view to a world position, staying inside the world once the view size is known'''
+        if self.view_size:
+            pos = [min(max(p, 0), max(s - v, 0)) for p, s, v in zip(pos, self.size, self.view_size)]
+        pos = (int(pos[0]), int(pos[1]))
+        if pos != self.camera:
+            self.camera = pos
+            self.invalidate()
+
+    def move_camera(self, offset):
+        '''Moves the view by the offset'''
+        self.set_camera((self.camera[0] + offset[0], self.camera[1] + offset[1]))
+
+    def screen_to_world(self, pos):
+        '''Translates a position on the canvas to the world'''
+        return (pos[0] + self.camera[0], pos[1] + self.camera[1])
+
+    def world_to_screen(self, pos):
+        '''Translates a world position to the canvas'''
+        return (pos[0] - self.camera[0], pos[1] - self.camera[1])
+
     def draw(self, canvas):
         '''Draw the world and its items'''
-        if canvas.background_color != self.background_color:
+        if self.layer is None or canvas.background_layer is not self.layer:
+            self.view_size = canvas.Surface.get_size()
+            self.layer = simplegui.StaticLayer(self.view_size, self.draw_blocks)
+            canvas.set_background_layer(self.layer)
+            self.drawn_background_color = None
+
+        # the canvas keeps a pygame.Color, so compare with the color last given to it
+        if self.drawn_background_color != self.background_color:
             canvas.set_background_color(self.background_color)
             canvas.draw_background()
-            
-        if len(self.blocks)>0:
-            for block in self.blocks:
-                block.draw(canvas)
-                
-                
+            self.drawn_background_color = self.background_color
+
+    def draw_blocks(self, layer):
+        '''Draws the blocks in the chunks under the region of the static layer being redrawn'''
+        clip = layer.get_clip()
+        offset = (-self.camera[0], -self.camera[1])
+        sprite.draw_sprites(layer, self.blocks_in(clip.move(self.camera)), offset)
+
+    def draw_sprites(self, canvas, sprites):
+        '''Draws sprites with world positions, like a cursor, on the canvas through the camera'''
+        sprite.draw_sprites(canvas, sprites, (-self.camera[0], -self.camera[1]))
+
+    def invalidate(self, block=None):
+        '''Redraws the block's area, or the whole view, on the next frame'''
+        if block is None:
+            if self.layer:
+                self.layer.invalidate()
+        else:
+            self.invalidate_region(block.get_bounds())
+
+    def invalidate_region(self, rect):
+        '''Redraws a (left, top, width, height) world region on the next frame, if it is in view'''
+        if self.layer:
+            left, top, width, height = rect
+            self.layer.invalidate((left - self.camera[0], top - self.camera[1], width, height))
+
     def update(self):
         '''Update the world'''
         pass
-    
+
+    def __len__(self):
+        '''Returns the number of blocks'''
+        return self.block_count
+
     def __repr__(self):
         '''Returns the world representation'''
-        return 'World(size={0!r}, background_color={1!r}, blocks={2})'.format(self.size, self.background_color, self.blocks)
\ No newline at end of file
+        return 'World(size={0!r}, background_color={1!r}, blocks={2!r}, chunks={3!r}, unloaded_chunks={4!r})'.format(self.size, self.background_color, self.block_count, len(self.chunks) + len(self.unloaded_chunks), len(self.unloaded_chunks))
+
+def rect_cells(first, last):
+    '''The cells in the rectangle between two corner cells, row by row'''
+    left, right = min(first[0], last[0]), max(first[0], last[0])
+    top, bottom = min(first[1], last[1]), max(first[1], last[1])
+    return [(col, row) for row in range(top, bottom + 1) for col in range(left, right + 1)]
+
+def line_cells(first, last):
+    '''The cells on a straight line between two cells, including both ends'''
+    col, row = first
+    d_col, d_row = abs(last[0] - col), -abs(last[1] - row)
+    step_col = 1 if last[0] > col else -1
+    step_row = 1 if last[1] > row else -1
+    error = d_col + d_row
+    cells = [(col, row)]
+    while (col, row) != tuple(last):
+        double_error = 2*error
+        if double_error >= d_row:
+            error += d_row
+            col += step_col
+        if double_error <= d_col:
+            error += d_col
+            row += step_row
+        cells.append((col, row))
+    return cells
+
+def paste_cells(region, cell):
+    '''The (cell, palette entry) changes to paste a region copied with copy_region with its top left on the cell'''
+    return [((cell[0] + offset[0], cell[1] + offset[1]), entry) for offset, entry in region]
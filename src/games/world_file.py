@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+'''
+Binary world files, so big worlds can be saved and opened quickly
+
+A file starts with a header, then a palette of the kinds of blocks in the
+world, then a directory of where each chunk's cells are, then the cells. Each
+chunk's cells are an array of 16 bit numbers, one per cell row by row, that
+are 0 for an empty cell and otherwise one more than the cell's palette index.
+All numbers are little endian.
+
+Files are read through a memory map, so opening one only reads the header,
+palette and directory, and each chunk's cells are read when asked for.
+
+Created on Oct 18, 2026
+
+@author: Robb
+'''
+
+import array
+import itertools
+import json
+import mmap
+import os
+import struct
+import sys
+
+from game_tools import simplegui
+from game_tools import assets
+from game_tools import sprite
+
+MAGIC = 'PGWORLD\0'
+VERSION = 1
+
+# magic, version, cell size, chunk cells, world width and height, block count, chunk count, palette table length
+HEADER = struct.Struct('<8sHHHiiIII')
+# chunk col and row, offset of the cells in the file, number of blocks
+CHUNK_ENTRY = struct.Struct('<iiII')
+
+def palette_entry(block):
+    '''The fields that make a block's kind, without its position'''
+    image_file, image_size = None, None
+    if block.image:
+        image_file, image_size = block.image.img_info.img_file, tuple(block.image.img_info.size)
+    return (block.name, image_file, image_size, tuple(block.size), block.rot, block.color, block.line_color, block.line_width)
+
+def make_block(entry, pos):
+    '''Makes a block of the palette entry's kind at the position'''
+    name, image_file, image_size, size, rot, color, line_color, line_width = entry
+    image = assets.get_image(simplegui.Image_Info(image_file, tuple(image_size))) if image_file else None
+    return sprite.CompactSprite(name, pos, [0,0], rot, size, color, line_color, line_width, image=image)
+
+def from_json(value):
+    '''Turns the unicode strings and lists json reads back into strings and tuples'''
+    if isinstance(value, unicode):
+        return str(value)
+    elif isinstance(value, list):
+        return tuple([from_json(item) for item in value])
+    elif isinstance(value, dict):
+        return dict([(from_json(key), from_json(item)) for key, item in value.iteritems()])
+    return value
+
+def write_world_file(world, file_name, reader=None):
+    '''
+    Writes the world's chunks to a world file. The world's unloaded chunks
+    are copied from the reader without making their blocks.
+    '''
+    palette = []
+    palette_index = dict([])
+    chunk_cells = world.chunk_cells
+    chunk_entries = [(key, [(cell, palette_entry(block)) for cell, block in chunk.iteritems()])
+                     for key, chunk in sorted(world.chunks.iteritems())]
+    if reader:
+        chunk_entries = itertools.chain(chunk_entries, reader.iter_chunks(world.unloaded_chunks))
+    chunks = []
+    for key, entries in chunk_entries:
+        cells = array.array('H', [0]*(chunk_cells*chunk_cells))
+        for cell, entry in entries:
+            if entry not in palette_index:
+                palette_index[entry] = len(palette)
+                palette.append(entry)
+            cells[(cell[1] % chunk_cells)*chunk_cells + cell[0] % chunk_cells] = palette_index[entry] + 1
+        chunks.append((key, len(entries), cells))
+
+    meta = json.dumps(dict([('background_color', world.background_color), ('palette', palette)]))
+    offset = HEADER.size + len(meta) + CHUNK_ENTRY.size*len(chunks)
+    header = HEADER.pack(MAGIC, VERSION, world.cell_size, chunk_cells, int(world.size[0]), int(world.size[1]),
+                         sum([count for key, count, cells in chunks]), len(chunks), len(meta))
+
+    with open(file_name, 'wb') as f:
+        f.write(header)
+        f.write(meta)
+        for key, count, cells in chunks:
+            f.write(CHUNK_ENTRY.pack(key[0], key[1], offset, count))
+            offset += cells.itemsize*len(cells)
+        for key, count, cells in chunks:
+            if sys.byteorder == 'big':
+                cells.byteswap()
+            f.write(cells.tostring())
+
+def replace_file(temp_file, file_name):
+    '''Replaces the file with the temporary file it was written to'''
+    if os.path.exists(file_name):
+        os.remove(file_name)
+    os.rename(temp_file, file_name)
+
+class WorldReader(object):
+    '''
+    Reads a world file through a memory map, reading the cells of each chunk
+    only when they are asked for
+    '''
+
+    def __init__(self, file_name):
+        '''Opens the file and reads its header, palette and directory'''
+        self.file_name = file_name
+        self.file = open(file_name, 'rb')
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            (magic, version, self.cell_size, self.chunk_cells, width, height,
+             self.block_count, chunk_count, meta_length) = HEADER.unpack_from(self.map, 0)
+            if magic != MAGIC:
+                raise ValueError('{0} is not a world file'.format(file_name))
+            if version != VERSION:
+                raise ValueError('{0} has world file version {1}, not {2}'.format(file_name, version, VERSION))
+            self.size = (width, height)
+            meta = from_json(json.loads(self.map[HEADER.size:HEADER.size + meta_length]))
+            self.background_color = meta['background_color']
+            self.palette = meta['palette']
+            self.chunks = dict([])
+            for i in range(chunk_count):
+                col, row, offset, count = CHUNK_ENTRY.unpack_from(self.map, HEADER.size + meta_length + i*CHUNK_ENTRY.size)
+                self.chunks[(col, row)] = (offset, count)
+        except Exception:
+            self.close()
+            raise
+
+    def read_chunk(self, key):
+        '''Reads the (cell, palette entry) of each block in the chunk'''
+        offset, count = self.chunks[key]
+        chunk_cells = self.chunk_cells
+        cells = array.array('H')
+        cells.fromstring(self.map[offset:offset + cells.itemsize*chunk_cells*chunk_cells])
+        if sys.byteorder == 'big':
+            cells.byteswap()
+        left, top = key[0]*chunk_cells, key[1]*chunk_cells
+        return [((left + i % chunk_cells, top + i // chunk_cells), self.palette[index - 1])
+                for i, index in enumerate(cells) if index]
+
+    def iter_chunks(self, keys=None):
+        '''Yields the key and blocks of each chunk, or just the chunks with the keys, in the order they are in the file'''
+        keys = self.chunks.keys() if keys is None else list(keys)
+        for key in sorted(keys, key=lambda key: self.chunks[key][0]):
+            yield key, self.read_chunk(key)
+
+    def close(self):
+        '''Closes the memory map and file'''
+        if getattr(self, 'map', None):
+            self.map.close()
+            self.map = None
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        '''Returns the file name and what is in it'''
+        return 'WorldReader(file_name={0!r}, size={1!r}, blocks={2!r}, chunks={3!r}, palette={4!r})'.format(self.file_name, self.size, self.block_count, len(self.chunks), len(self.palette))
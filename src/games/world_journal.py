@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+'''
+Edit journal for worlds, so edits are kept as they are made and can be undone
+
+Each edit is appended to the journal file as a line of json by a background
+thread, so the game never waits on the disk. Every so many edits the whole
+world is saved to the world file as a snapshot and the journal is emptied.
+Opening a world reads the snapshot and replays the journal on top of it,
+which recovers the edits made since the last snapshot after a crash.
+
+Edits are (kind, cell, new, old) with the palette entries of the blocks
+before and after, or the background colors for 'background' edits, so
+replaying an edit twice is the same as once and every edit can be undone.
+Edits of many cells at once are ('cells', palette, changes, None) with a
+(cell, new, old) change for each cell, where new and old are indexes into
+the palette of the edit or None for an empty cell.
+
+Created on Oct 18, 2026
+
+@author: Robb
+'''
+
+import collections
+import json
+import os
+import threading
+import Queue
+
+from games import world
+from games import world_file
+
+JOURNAL_SUFFIX = '.journal'
+SNAPSHOT_EDITS = 1000
+UNDO_EDITS = 1000
+
+def journal_file(file_name):
+    '''The journal file for a world file'''
+    return file_name + JOURNAL_SUFFIX
+
+def apply_edit(the_world, edit):
+    '''Makes an edit on the world'''
+    kind, cell, new, old = edit
+    if kind == 'background':
+        the_world.background_color = new
+    elif kind == 'cells':
+        palette, cell_center = cell, the_world.cell_center
+        the_world.set_cells([(change_cell, None if change_new is None else world_file.make_block(palette[change_new], cell_center(change_cell)))
+                             for change_cell, change_new, change_old in new])
+    elif new is None:
+        the_world.remove_cell(cell)
+    else:
+        the_world.add_block(world_file.make_block(new, the_world.cell_center(cell)))
+
+def inverse_edit(edit):
+    '''The edit that undoes an edit'''
+    kind, cell, new, old = edit
+    if kind == 'background':
+        return (kind, cell, old, new)
+    elif kind == 'cells':
+        return (kind, cell, [(change_cell, change_old, change_new) for change_cell, change_new, change_old in reversed(new)], None)
+    return ('delete' if old is None else 'place', cell, old, new)
+
+def replay(the_world, file_name):
+    '''Makes the edits in the world file's journal on the world, returning how many there were'''
+    count = 0
+    if not os.path.exists(journal_file(file_name)):
+        return count
+    with open(journal_file(file_name), 'rb+') as f:
+        end = 0
+        for line in iter(f.readline, ''):
+            if not line.endswith('\n'):
+                break
+            try:
+                edit = world_file.from_json(json.loads(line))
+            except ValueError:
+                break
+            apply_edit(the_world, edit)
+            count += 1
+            end = f.tell()
+        # a crash can leave the last edit half written, so new edits would be appended to it
+        f.truncate(end)
+    return count
+
+def open_journal(file_name, snapshot_edits=SNAPSHOT_EDITS, undo_edits=UNDO_EDITS):
+    '''Opens the world in the world file with its journal replayed, or None if there is no world file'''
+    if not os.path.exists(file_name):
+        return None
+    the_world = world.World.load(file_name)
+    edit_count = replay(the_world, file_name)
+    return Journal(the_world, file_name, edit_count, snapshot_edits, undo_edits)
+
+class Journal(object):
+    '''
+    Makes edits on a world, keeping them in the journal of the world file
+    and a list of edits to undo
+    '''
+
+    def __init__(self, the_world, file_name, edit_count=0, snapshot_edits=SNAPSHOT_EDITS, undo_edits=UNDO_EDITS):
+        '''
+        Starts journaling edits of the world, which should be the world in the
+        world file with its journal replayed, or be saved with snapshot
+        '''
+        self.world = the_world
+        self.file_name = file_name
+        self.edit_count = edit_count
+        self.snapshot_edits = snapshot_edits
+        self.undo_edits = collections.deque(maxlen=undo_edits)
+        self.error = None
+        self.queue = Queue.Queue()
+        self.thread = threading.Thread(target=self.write, name='world journal')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def place(self, block):
+        '''
+        Places a block on the cell under its position, returning the block it
+        replaced or None. Replacing a block of the same kind isn't an edit, and
+        blocks outside the world aren't placed.
+        '''
+        cell = self.world.cell_of(block.pos)
+        if not self.world.has_cell(cell):
+            return None
+        old_block = self.world.add_block(block)
+        entry = world_file.palette_entry(block)
+        old_entry = world_file.palette_entry(old_block) if old_block else None
+        if entry != old_entry:
+            self.record(('place', cell, entry, old_entry))
+        return old_block
+
+    def delete(self, cell):
+        '''Removes the block on the cell, returning it or None if the cell is empty'''
+        block = self.world.remove_cell(cell)
+        if block:
+            self.record(('delete', cell, None, world_file.palette_entry(block)))
+        return block
+
+    def set_cells(self, changes):
+        '''
+        Puts blocks of the kinds of the (cell, palette entry) changes on their
+        cells, or empties the cells for None entries, as one edit. Cells
+        outside the world are left out. Returns the number of cells changed.
+        '''
+        the_world = self.world
+        palette = []
+        palette_index = dict([])
+        cell_changes = []
+        block_changes = []
+        for cell, entry in changes:
+            if not the_world.has_cell(cell):
+                continue
+            old_entry = the_world.kind_at(cell)
+            if entry == old_entry:
+                continue
+            indexes = []
+            for kind in (entry, old_entry):
+                if kind is not None and kind not in palette_index:
+                    palette_index[kind] = len(palette)
+                    palette.append(kind)
+                indexes.append(None if kind is None else palette_index[kind])
+            cell_changes.append((cell, indexes[0], indexes[1]))
+            block_changes.append((cell, None if entry is None else world_file.make_block(entry, the_world.cell_center(cell))))
+        if cell_changes:
+            the_world.set_cells(block_changes)
+            self.record(('cells', palette, cell_changes, None))
+        return len(cell_changes)
+
+    def set_background(self, color):
+        '''Changes the background color of the world'''
+        old_color = self.world.background_color
+        if color != old_color:
+            self.world.background_color = color
+            self.record(('background', None, color, old_color))
+
+    def undo(self):
+        '''Undoes the last edit, returning the edit that undid it or None if there is nothing to undo'''
+        if not self.undo_edits:
+            return None
+        edit = inverse_edit(self.undo_edits.pop())
+        apply_edit(self.world, edit)
+        self.log(edit)
+        return edit
+
+    def record(self, edit):
+        '''Keeps an edit to undo and in the journal'''
+        self.undo_edits.append(edit)
+        self.log(edit)
+
+    def log(self, edit):
+        '''Queues an edit to be appended to the journal, taking a snapshot every snapshot_edits edits'''
+        self.queue.put(('edit', json.dumps(edit)))
+        self.edit_count += 1
+        if self.edit_count >= self.snapshot_edits:
+            self.snapshot()
+
+    def snapshot(self):
+        '''Queues saving the whole world to the world file, which empties the journal, without loading its unloaded chunks'''
+        self.queue.put(('snapshot', self.world.copy()))
+        self.edit_count = 0
+
+    def write(self):
+        '''Writes the queued edits and snapshots, on the journal thread'''
+        journal = None
+        while True:
+            task = self.queue.get()
+            if task is None:
+                break
+            kind, data = task
+            try:
+                if kind == 'edit':
+                    if journal is None:
+                        journal = open(journal_file(self.file_name), 'a')
+                    journal.write(data + '\n')
+                    if self.queue.empty():
+                        journal.flush()
+                        os.fsync(journal.fileno())
+                else:
+                    if journal:
+                        journal.close()
+                        journal = None
+                    if not os.path.isdir(os.path.dirname(self.file_name) or '.'):
+                        os.makedirs(os.path.dirname(self.file_name))
+                    temp_file = self.file_name + '.tmp'
+                    # the chunks the world hasn't loaded are streamed from its file, here instead of on the game's thread
+                    reader = world_file.WorldReader(data.source_file) if data.source_file else None
+                    try:
+                        world_file.write_world_file(data, temp_file, reader)
+                    finally:
+                        if reader:
+                            reader.close()
+                    self.world.replace_file(temp_file, self.file_name)
+                    # the edits so far are in the snapshot
+                    if os.path.exists(journal_file(self.file_name)):
+                        os.remove(journal_file(self.file_name))
+            except Exception as e:
+                # keep writing the edits after this one, close raises the error
+                self.error = e
+        if journal:
+            journal.close()
+
+    def close(self):
+        '''Waits for the queued edits to be written and stops the journal thread, raising any error writing them'''
+        if self.thread:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+        if self.error:
+            raise self.error
+
+    def __repr__(self):
+        '''Returns the file name and number of edits'''
+        return 'Journal(file_name={0!r}, edit_count={1!r}, undo_edits={2!r}, world={3!r})'.format(self.file_name, self.edit_count, len(self.undo_edits), self.world)
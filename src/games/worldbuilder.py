@@ -6,12 +6,22 @@ Created on Jun 23, 2014
 @author: Robb
 '''
 
+import os
+
 from game_tools import simplegui
+from game_tools import assets
 from games import world
+from games import world_file
+from games import world_journal
 from game_tools import sprite
 
 WIDTH = 600
 HEIGHT = 600
+WORLD_SIZE = (6000,6000)
+SCROLL_CELLS = 5
+# the user's only copy of the world, so it is kept with their data files and not in a cache
+DATA_DIR = os.environ.get('XDG_DATA_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'share')
+WORLD_FILE = os.path.join(DATA_DIR, 'python_games', 'worlds', 'world.wld')
 
 BACKGROUND_COLORS = simplegui.BACKGROUND_COLORS
 
@@ -25,41 +35,77 @@ image_infos = dict([('dark_blue',simplegui.Image_Info('../lib/images/block_dark_
                     ('orange',simplegui.Image_Info('../lib/images/block_orange.png',(BLOCK_H,BLOCK_H)))])
 images = dict([])
 
+the_world = None
+journal = None
 cursor = None
 cursor_colors = image_infos.keys()
 cursor_color = cursor_colors[0]
 
+# rect, line and copy take two clicks, one on each end
+tool = 'cell'
+anchor = None
+mouse_cell = None
+clipboard = None
+
+SCROLL_KEYS = dict([('left',(-1,0)),('right',(1,0)),('up',(0,-1)),('down',(0,1))])
+TOOL_KEYS = dict([('t','cell'),('r','rect'),('l','line'),('f','fill'),('x','copy'),('v','paste')])
+
 def draw(canvas):
     '''Draw the world and builder'''
-    if the_world:
+    if the_world is not None:
         the_world.draw(canvas)
         
-    if type(cursor) is sprite.Sprite:
-        cursor.draw(canvas)
+        if isinstance(cursor, sprite.SpriteBase):
+            the_world.draw_sprites(canvas, [cursor])
+            
+        if anchor is not None and mouse_cell is not None:
+            corner = the_world.world_to_screen((min(anchor[0], mouse_cell[0])*BLOCK_H, min(anchor[1], mouse_cell[1])*BLOCK_H))
+            size = ((abs(anchor[0] - mouse_cell[0]) + 1)*BLOCK_H, (abs(anchor[1] - mouse_cell[1]) + 1)*BLOCK_H)
+            canvas.draw_rect(corner, size, 2, 'White')
 
 def mouse_click(pos):
-    '''Handles the mouse click'''
-    global cursor
-    if type(cursor) is sprite.Sprite:
-        selected_blocks = [block for block in the_world.blocks if block.contains(pos)]
-        for block in selected_blocks:
-            the_world.blocks.remove(block)
-        the_world.blocks.append(cursor)
-        cursor = new_cursor(pos)
-    elif cursor == 'del':
-        selected_blocks = [block for block in the_world.blocks if block.contains(pos)]
-        for block in selected_blocks:
-            the_world.blocks.remove(block)
+    '''Handles the mouse click, using the tool to place the cursor's blocks or delete'''
+    global cursor, anchor, clipboard
+    cell = the_world.cell_of(the_world.screen_to_world(pos))
+    if tool == 'cell':
+        if isinstance(cursor, sprite.SpriteBase):
+            # replaces the block already on the cell
+            cursor.set_pos(the_world.cell_center(cell))
+            journal.place(cursor)
+            cursor = new_cursor(the_world.cell_center(cell))
+        elif cursor == 'del':
+            journal.delete(cell)
+    elif tool == 'fill':
+        if cursor is not None:
+            kind = cursor_kind()
+            journal.set_cells([(fill_cell, kind) for fill_cell in the_world.flood_cells(cell)])
+    elif tool == 'paste':
+        if clipboard:
+            journal.set_cells(world.paste_cells(clipboard, cell))
+    elif anchor is None:
+        anchor = cell
+    else:
+        if tool == 'copy':
+            clipboard = the_world.copy_region(anchor, cell)
+        elif cursor is not None:
+            kind = cursor_kind()
+            cells = world.rect_cells(anchor, cell) if tool == 'rect' else world.line_cells(anchor, cell)
+            journal.set_cells([(tool_cell, kind) for tool_cell in cells])
+        anchor = None
+        
+def cursor_kind():
+    '''The palette entry of the cursor's block, or None to delete'''
+    return world_file.palette_entry(cursor) if isinstance(cursor, sprite.SpriteBase) else None
         
 def mouse_move(pos):
     '''Handles the mouse movement'''
-    global cursor
+    global cursor, mouse_cell
     
 #     if not cursor:
 #         cursor = new_cursor(pos)
-    if type(cursor) is sprite.Sprite:
-        snap_pos = [(int(pos[0]/BLOCK_H)+0.5)*BLOCK_H,(int(pos[1]/BLOCK_H)+0.5)*BLOCK_H]
-        cursor.set_pos(snap_pos)
+    mouse_cell = the_world.cell_of(the_world.screen_to_world(pos))
+    if isinstance(cursor, sprite.SpriteBase):
+        cursor.set_pos(the_world.cell_center(mouse_cell))
 
 def key_down(key):
     '''Handles the key down event'''
@@ -67,24 +113,35 @@ def key_down(key):
 
 def key_up(key):
     '''Handle the key up event'''
-    global cursor_color, cursor
+    global cursor_color, cursor, tool, anchor
     if key == 'c':
         cursor_color = cursor_colors[(cursor_colors.index(cursor_color)+1) % len(cursor_colors)]
-        if type(cursor) is sprite.Sprite:
+        if isinstance(cursor, sprite.SpriteBase):
             cursor.image = images[cursor_color]
         else:
             cursor = new_cursor([0,0])
     elif key == 'p':
         print the_world
+    elif key == 's':
+        journal.snapshot()
+    elif key == 'o':
+        open_world()
+    elif key == 'z':
+        journal.undo()
     elif key == 'b':
-        the_world.background_color = BACKGROUND_COLORS[(BACKGROUND_COLORS.index(the_world.background_color)+1) % len(BACKGROUND_COLORS)]
+        journal.set_background(BACKGROUND_COLORS[(BACKGROUND_COLORS.index(the_world.background_color)+1) % len(BACKGROUND_COLORS)])
     elif key == 'd':
         cursor = 'del'
+    elif TOOL_KEYS.has_key(key):
+        tool = TOOL_KEYS[key]
+        anchor = None
+    elif SCROLL_KEYS.has_key(key):
+        the_world.move_camera([SCROLL_CELLS*BLOCK_H*d for d in SCROLL_KEYS[key]])
         
-def setup():
+def setup(backend='window'):
     '''Setup the frame and event handlers'''
     global frame, images
-    frame = simplegui.Frame('World',(WIDTH,HEIGHT))
+    frame = simplegui.Frame('World',(WIDTH,HEIGHT),backend=backend)
     frame.set_draw_handler(draw)
     frame.set_key_down_handler(key_down)
     frame.set_key_up_handler(key_up)
@@ -92,21 +149,44 @@ def setup():
     frame.set_mouse_move_handler(mouse_move)
     
     
-    images = dict([(key, simplegui.Image(image_info)) for key, image_info in image_infos.iteritems()])
+    images = assets.get_images(image_infos)
     return frame
 
-def new_world():
-    '''Makes a new world'''
-    global the_world
-    the_world = games.world.World((WIDTH,HEIGHT),'Black')
+def new_world(file_name=WORLD_FILE):
+    '''Makes a new world, replacing the one saved in the world file'''
+    global the_world, journal
+    close_world()
+    the_world = world.World(WORLD_SIZE,'Black',cell_size=BLOCK_H)
+    journal = world_journal.Journal(the_world, file_name)
+    journal.snapshot()
+    
+def open_world(file_name=WORLD_FILE):
+    '''Opens the world saved in the world file with the edits made since, returning False if there is none'''
+    global the_world, journal
+    close_world()
+    opened = world_journal.open_journal(file_name)
+    if opened is None:
+        return False
+    journal = opened
+    the_world = journal.world
+    return True
+    
+def close_world():
+    '''Waits for the world's edits to be saved'''
+    global journal
+    if journal:
+        journal.close()
+        journal = None
     
 def new_cursor(pos):
     '''Makes a new cursor'''
-    return sprite.Sprite('block',pos,size=(BLOCK_H,BLOCK_H),image=images[cursor_color])
+    return sprite.CompactSprite('block',pos,size=(BLOCK_H,BLOCK_H),image=images[cursor_color])
     
 if __name__ == '__main__':
     setup()
     
-    new_world()
+    if not open_world():
+        new_world()
     frame.start()
+    close_world()
     frame.quit()
\ No newline at end of file
@@ -7,12 +7,8 @@ Created on Jul 12, 2014
 '''
 
 from game_tools import simplegui
-from games import fifteen
-from games import breakout
-from games import pong
-from games import snake
-from games import tetris
-from games import cryptoquip
+from game_tools import assets
+import importlib
 
 HEIGHT = 400
 CONTROL_WIDTH = 200
@@ -21,38 +17,32 @@ BUTTON_FONT_SIZE = 20
 
 selected_button = None
 
-def game_starter(the_game):
-    '''Start a game'''
+# (button name, module) of the games, modules are imported when their game is started
+GAMES = []
+
+def register_game(name, module_name):
+    '''Adds a game to the menu'''
+    GAMES.append((name, module_name))
+
+register_game('Fifteen', 'games.fifteen')
+register_game('Pong', 'games.pong')
+register_game('Tetris', 'games.tetris')
+register_game('Snake', 'games.snake')
+register_game('Breakout', 'games.breakout')
+register_game('Cryptoquip', 'games.cryptoquip')
+
+def game_starter(module_name):
+    '''Import and start a game'''
+    the_game = importlib.import_module(module_name)
     the_frame = the_game.setup()
     the_game.new_game()
     the_frame.start()
     
     frame.start()
 
-
-def fifteen_starter():
-    '''Starts the fifteen game'''
-    game_starter(fifteen)
-
-def pong_starter():
-    '''Starts the pong game'''
-    game_starter(pong)
-
-def tetris_starter():
-    '''Starts the tetris game'''
-    game_starter(tetris)
-
-def snake_starter():
-    '''Starts the snake game'''
-    game_starter(snake)
-
-def breakout_starter():
-    '''Starts the breakout game'''
-    game_starter(breakout)
-
-def cryptoquip_starter():
-    '''Starts the cryptoquip game'''
-    game_starter(cryptoquip)
+def make_starter(module_name):
+    '''Makes a button handler that starts the game'''
+    return lambda: game_starter(module_name)
     
 def key_up(key):
     '''Handles the key up events'''
@@ -75,25 +65,26 @@ def change_selected_button(direction):
     buttons[selected_button].color = 'white'
     
     
-def setup():
+def setup(backend='window'):
     '''Setup the menu for the games.'''
     global frame, buttons
     
-    frame = simplegui.Frame('Menu',(0,HEIGHT),CONTROL_WIDTH)
+    frame = simplegui.Frame('Menu',(0,HEIGHT),CONTROL_WIDTH,backend=backend)
     frame.set_key_up_handler(key_up)
+    simplegui.prewarm_fonts([frame.control_panel.default_font_h, BUTTON_FONT_SIZE])
     
     frame.add_label('Menu')
     
-    buttons = []
-    buttons.append(frame.add_button('Fifteen', fifteen_starter, BUTTON_WIDTH, BUTTON_FONT_SIZE))
-    buttons.append(frame.add_button('Pong', pong_starter, BUTTON_WIDTH, BUTTON_FONT_SIZE))
-    buttons.append(frame.add_button('Tetris', tetris_starter, BUTTON_WIDTH, BUTTON_FONT_SIZE))
-    buttons.append(frame.add_button('Snake', snake_starter, BUTTON_WIDTH, BUTTON_FONT_SIZE))
-    buttons.append(frame.add_button('Breakout', breakout_starter, BUTTON_WIDTH, BUTTON_FONT_SIZE))
-    buttons.append(frame.add_button('Cryptoquip', cryptoquip_starter, BUTTON_WIDTH, BUTTON_FONT_SIZE))
+    buttons = [frame.add_button(name, make_starter(module_name), BUTTON_WIDTH, BUTTON_FONT_SIZE) for name, module_name in GAMES]
+    
+    preload_images()
     
     return frame
 
+def preload_images():
+    '''Starts reading the game images, so starting a game does not wait on the disk'''
+    assets.preload_atlas()
+
 if __name__ == '__main__':
     setup()
     
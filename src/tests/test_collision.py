@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+'''
+Tests of swept collisions
+
+Run from the src directory: python -m unittest discover tests
+
+Created on Oct 18, 2026
+
+@author: Robb
+'''
+
+import unittest
+
+from game_tools import collision
+from game_tools import sprite
+from games import breakout
+
+class SweepPathTest(unittest.TestCase):
+    '''Tests moving through a tick of hits'''
+
+    def test_wall_hit_again(self):
+        '''A ball squeezed back to a wall it already hit this tick bounces off it again'''
+        wall = collision.world_walls((breakout.WIDTH, breakout.HEIGHT), 'l')[0]
+        paddle = sprite.Sprite(pos=(131.1, 575.), vel=(-8, 0), size=breakout.PADDLE_SIZE)
+        ball = sprite.Sprite(pos=(17.25, 568.1), vel=(-10.62, -9.36), size=breakout.BALL_SIZE)
+        def bounce(target, pos, vel, normal):
+            if target is paddle:
+                return breakout.paddle_bounce(paddle, vel, normal)
+            return collision.reflect(vel, normal)
+        hits = collision.sweep_sprite(ball, [paddle, wall], bounce)
+        self.assertEqual([target for time, normal, target in hits][:3], [wall, paddle, wall])
+        self.assertGreaterEqual(ball.pos[0] - 0.5*ball.size[0], -1e-9)
+
+    def test_paddle_against_wall(self):
+        '''The breakout ball isn't pushed into the wall when the paddle squeezes it against it'''
+        frame = breakout.setup('none')
+        breakout.new_game()
+        breakout.ball.pos, breakout.ball.vel = (17.25, 568.1), (-10.62, -9.36)
+        breakout.paddle.pos = (131.1, 575.)
+        breakout.control_state['left'] = True
+        try:
+            for tick in range(10):
+                frame.step()
+                ball = breakout.ball
+                self.assertGreaterEqual(ball.pos[0] - 0.5*ball.size[0], -1e-9, ball)
+        finally:
+            breakout.control_state['left'] = False
+
+    def test_no_hit_again_in_place(self):
+        '''A target that doesn't turn the path around isn't hit again where it was hit'''
+        gutter = collision.Box((50, 100), (100, 2))
+        def sweep(pos, vel, target_pos, target_size, target_vel, max_time):
+            return collision.sweep_rect(pos, (10, 10), vel, target_pos, target_size, target_vel, max_time)
+        hits = collision.sweep_path((50, 80), (0, 20), [gutter], sweep, bounce=lambda target, pos, vel, normal: vel)[2]
+        self.assertEqual(len(hits), 1)
+
+    def test_paddle_side_bounce(self):
+        '''The ball only turns around on the side of the paddle if it is moving into it'''
+        paddle = sprite.Sprite(pos=(100, 100), vel=(-8, 0), size=breakout.PADDLE_SIZE)
+        self.assertEqual(breakout.paddle_bounce(paddle, (5, 3), (-1, 0))[0], -5 - 0.8)
+        self.assertEqual(breakout.paddle_bounce(paddle, (-5, 3), (-1, 0))[0], -5 - 0.8)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+'''
+Tests of stepping headless frames
+
+Run from the src directory: python -m unittest discover tests
+
+Created on Oct 18, 2026
+
+@author: Robb
+'''
+
+import unittest
+
+from game_tools import simplegui
+from games import fifteen
+from games import pong
+
+class StepTest(unittest.TestCase):
+    '''Tests advancing a frame without waiting'''
+
+    def test_stepped_render_is_current(self):
+        '''A render after a step draws the positions of the update just run'''
+        frame = pong.setup('offscreen')
+        pong.new_game()
+        pong.mute_off = False
+        pong.ball.pos, pong.ball.vel = [200, 200], [3000, 0]
+        frame.step()
+        white = frame.canvas.Surface.map_rgb(simplegui.pygame.Color('White'))
+        ball_pos = [int(p) for p in pong.ball.pos]
+        prev_pos = [int(p) for p in pong.ball.prev_pos]
+        self.assertNotEqual(ball_pos, prev_pos)
+        self.assertEqual(frame.canvas.Surface.get_at_mapped(ball_pos), white)
+        self.assertNotEqual(frame.canvas.Surface.get_at_mapped(prev_pos), white)
+    def test_draw_handler_simulates_headless(self):
+        '''A frame with no update handler and no screen still runs its draw handler'''
+        frame = fifteen.setup('none')
+        fifteen.new_game()
+        for key in fifteen.controls:
+            fifteen.control_move_tile(key)
+            if fifteen.swapping_space:
+                break
+        self.assertIsNotNone(fifteen.swapping_space)
+        frame.step(int(fifteen.SWAP_STOP))
+        self.assertIsNone(fifteen.swapping_space)
+        self.assertEqual(frame.canvas.dirty_rects, [])
+
+if __name__ == '__main__':
+    unittest.main()
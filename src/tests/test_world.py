@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+'''
+Tests of editing worlds
+
+Run from the src directory: python -m unittest discover tests
+
+Created on Oct 18, 2026
+
+@author: Robb
+'''
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from game_tools import sprite
+from games import world
+from games import world_file
+from games import world_journal
+
+class EditTest(unittest.TestCase):
+    '''Tests editing regions of cells'''
+
+    def setUp(self):
+        '''Journals a small world in a temporary directory'''
+        self.dir = tempfile.mkdtemp()
+        self.world = world.World((200, 200), 'Black', cell_size=20)
+        self.journal = world_journal.Journal(self.world, os.path.join(self.dir, 'world.wld'))
+        self.kind = world_file.palette_entry(sprite.CompactSprite('Block', (10, 10), [0,0], 0, (20, 20), 'Red', 'White', 1))
+
+    def tearDown(self):
+        self.journal.close()
+        shutil.rmtree(self.dir)
+
+    def test_paste_past_edge(self):
+        '''Pasting over the edge of the world only changes the cells inside it'''
+        self.journal.set_cells([(cell, self.kind) for cell in world.rect_cells((0, 0), (3, 3))])
+        changed = self.journal.set_cells(world.paste_cells(self.world.copy_region((0, 0), (3, 3)), (8, 8)))
+        self.assertEqual(changed, 4)
+        self.assertEqual(len(self.world), 20)
+        self.assertTrue(all(self.world.has_cell(cell) for chunk in self.world.chunks.itervalues() for cell in chunk))
+        self.assertEqual(len(self.journal.undo_edits[-1][2]), 4)
+
+    def test_place_outside(self):
+        '''Blocks placed outside the world aren't placed or journaled'''
+        block = sprite.CompactSprite('Block', (-10, 10), [0,0], 0, (20, 20), 'Red', 'White', 1)
+        self.assertIsNone(self.journal.place(block))
+        self.assertEqual(len(self.world), 0)
+        self.assertFalse(self.journal.undo_edits)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+'''
+Packs the images in lib/images into one atlas image and an index of where
+each image is, so games load one file instead of each image separately.
+
+Run from the src directory after changing the images: python -m tools.build_atlas
+
+Created on Oct 18, 2026
+
+@author: Robb
+'''
+
+import os
+
+import pygame
+
+from game_tools import simplegui
+
+IMAGE_DIR = '../lib/images'
+ATLAS_WIDTH = 512
+
+def source_images(image_dir=IMAGE_DIR):
+    '''
+    The (name, surface) of each png in the directory and the directories in
+    it, except the atlas itself. Names are paths from the directory, so
+    images with the same file name in different directories are kept apart.
+    '''
+    atlas_name = os.path.basename(simplegui.ATLAS_FILE)
+    names = []
+    for dir_path, dir_names, file_names in os.walk(image_dir):
+        rel_dir = os.path.relpath(dir_path, image_dir)
+        for file_name in file_names:
+            name = file_name if rel_dir == '.' else os.path.join(rel_dir, file_name).replace(os.sep, '/')
+            if name.endswith('.png') and name != atlas_name:
+                names.append(name)
+    return [(name, pygame.image.load(os.path.join(image_dir, name))) for name in sorted(names)]
+
+def pack(sizes, width=ATLAS_WIDTH):
+    '''
+    Places (width, height) sizes on shelves, tallest first.
+    Returns the (x, y) of each size in the given order and the atlas size.
+    '''
+    width = max([width] + [size[0] for size in sizes])
+    positions = [None]*len(sizes)
+    x = y = shelf_height = 0
+    for i in sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0])):
+        w, h = sizes[i]
+        if x + w > width:
+            x = 0
+            y += shelf_height
+            shelf_height = 0
+        positions[i] = (x, y)
+        x += w
+        shelf_height = max(shelf_height, h)
+    return positions, (width, y + shelf_height)
+
+def build(image_dir=IMAGE_DIR, atlas_file=simplegui.ATLAS_FILE, index_file=simplegui.ATLAS_INDEX_FILE):
+    '''Writes the atlas image and index, returns the atlas size'''
+    images = source_images(image_dir)
+    positions, size = pack([surface.get_size() for name, surface in images])
+    atlas = pygame.Surface(size, pygame.SRCALPHA, 32)
+    with open(index_file, 'w') as index:
+        for (name, surface), pos in zip(images, positions):
+            # adding onto the clear atlas copies the pixels, alpha included
+            atlas.blit(surface, pos, special_flags=pygame.BLEND_RGBA_ADD)
+            index.write('{0} {1} {2} {3} {4}\n'.format(name, pos[0], pos[1], surface.get_width(), surface.get_height()))
+    pygame.image.save(atlas, atlas_file)
+    return size
+
+if __name__ == '__main__':
+    size = build()
+    print('wrote {0} and {1}, {2}x{3}'.format(simplegui.ATLAS_FILE, simplegui.ATLAS_INDEX_FILE, size[0], size[1]))